@@ -5,6 +5,10 @@ from traceback import format_exc
 from pyrogram import idle
 from Backend import __version__, db
 from Backend.helper.pinger import ping
+from Backend.helper.backfill import backfill_file_properties
+from Backend.helper.mirror import mirror_tier
+from Backend.helper.snapshot import restore_snapshot, save_snapshot
+from Backend.config import Telegram
 from Backend.logger import LOGGER
 from Backend.fastapi import server
 from Backend.helper.pyro import restart_notification, setup_bot_commands
@@ -38,10 +42,17 @@ async def start_services():
         await setup_bot_commands(StreamBot)
         await asleep(2)
 
+        if Telegram.MIRROR_ENABLED:
+            await mirror_tier.load()
+
+        if Telegram.WARM_RESTART:
+            loop.create_task(restore_snapshot())
+
         LOGGER.info('Initializing Telegram-Stremio Web Server...')
         await restart_notification()
         loop.create_task(server.serve())
         loop.create_task(ping())
+        loop.create_task(backfill_file_properties())
         
         LOGGER.info("Telegram-Stremio Started Successfully!")
         await idle()
@@ -52,6 +63,9 @@ async def stop_services():
     try:
         LOGGER.info("Stopping services...")
 
+        if Telegram.WARM_RESTART:
+            await save_snapshot()
+
         pending_tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
         for task in pending_tasks:
             task.cancel()
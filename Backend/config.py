@@ -24,4 +24,33 @@ class Telegram:
 
     ADMIN_USERNAME = getenv("ADMIN_USERNAME", "fyvio")
     ADMIN_PASSWORD = getenv("ADMIN_PASSWORD", "fyvio")
-    
+
+    # Streaming Tuning
+    CLIENT_AFFINITY = getenv("CLIENT_AFFINITY", "True").lower() == "true"
+    AFFINITY_LOAD_MARGIN = int(getenv("AFFINITY_LOAD_MARGIN", "3"))
+    HEDGE_REQUESTS = getenv("HEDGE_REQUESTS", "False").lower() == "true"
+    HEDGE_MIN_DELAY = float(getenv("HEDGE_MIN_DELAY", "1.0"))
+    HEDGE_BUDGET_PER_MINUTE = int(getenv("HEDGE_BUDGET_PER_MINUTE", "60"))
+    MEDIA_SESSIONS_PER_DC = max(1, int(getenv("MEDIA_SESSIONS_PER_DC", "2")))
+    MEDIA_CRYPTO_WORKERS = max(0, int(getenv("MEDIA_CRYPTO_WORKERS", "0")))
+    CHUNK_CACHE_MB = int(getenv("CHUNK_CACHE_MB", "256"))
+    CHUNK_CACHE_BACKEND = getenv("CHUNK_CACHE_BACKEND", "memory").lower()
+    CHUNK_CACHE_SHM_PATH = getenv("CHUNK_CACHE_SHM_PATH", "/dev/shm/telegram-stremio-chunks")
+    CHUNK_CACHE_VERIFY = getenv("CHUNK_CACHE_VERIFY", "True").lower() == "true"
+    PREDICTIVE_WARMUP = getenv("PREDICTIVE_WARMUP", "True").lower() == "true"
+    WARMUP_MAX_STREAMS = int(getenv("WARMUP_MAX_STREAMS", "3"))
+    BINGE_PREFETCH = getenv("BINGE_PREFETCH", "True").lower() == "true"
+    BINGE_PREFETCH_FRACTION = float(getenv("BINGE_PREFETCH_FRACTION", "0.8"))
+    BINGE_PREFETCH_CHUNKS = int(getenv("BINGE_PREFETCH_CHUNKS", "4"))
+    MIRROR_ENABLED = getenv("MIRROR_ENABLED", "False").lower() == "true"
+    MIRROR_DIR = getenv("MIRROR_DIR", "mirror")
+    MIRROR_MAX_GB = float(getenv("MIRROR_MAX_GB", "20"))
+    MIRROR_MIN_PLAYS = int(getenv("MIRROR_MIN_PLAYS", "3"))
+    WARM_RESTART = getenv("WARM_RESTART", "True").lower() == "true"
+    WARM_RESTART_FILE = getenv("WARM_RESTART_FILE", "warm_restart.json")
+    STREAM_MAX_PER_IP = int(getenv("STREAM_MAX_PER_IP", "8"))
+    STREAM_RATE_PER_IP_MB = float(getenv("STREAM_RATE_PER_IP_MB", "0"))
+    STREAM_TIERS = [tier.strip() for tier in (getenv("STREAM_TIERS") or "").split(",") if tier.strip()]
+    SHARD_TIMEOUT = float(getenv("SHARD_TIMEOUT", "10"))
+    INGEST_BATCH_SIZE = max(1, int(getenv("INGEST_BATCH_SIZE", "50")))
+    INGEST_BATCH_WAIT_MS = int(getenv("INGEST_BATCH_WAIT_MS", "500"))
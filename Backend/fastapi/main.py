@@ -1,9 +1,10 @@
-from fastapi import FastAPI, Request, Form, Depends, Query
+from fastapi import FastAPI, Request, Form, Depends, Query, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 from Backend import __version__
+from Backend.config import Telegram
 
 from Backend.fastapi.security.credentials import require_auth
 from Backend.fastapi.routes.stream_routes import router as stream_router
@@ -87,9 +88,10 @@ async def list_media(
     page: int = Query(1, ge=1), 
     page_size: int = Query(24, ge=1, le=100), 
     search: str = Query("", max_length=100),
+    cursor: str = Query("", max_length=512),
     _: bool = Depends(require_auth)
 ):
-    return await list_media_api(media_type, page, page_size, search)
+    return await list_media_api(media_type, page, page_size, search, cursor)
 
 @app.delete("/api/media/delete")
 async def delete_media(tmdb_id: int, db_index: int, media_type: str, _: bool = Depends(require_auth)):
@@ -120,16 +122,64 @@ async def delete_tv_season(tmdb_id: int, db_index: int, season: int, _: bool = D
 async def get_workloads(_: bool = Depends(require_auth)):
     try:
         from Backend.pyrofork.bot import work_loads
+        from Backend.helper.dc_stats import dc_throughput
+        from Backend.helper.chunk_cache import chunk_cache
+        from Backend.helper.stream_limits import stream_limiter
         return {
             "loads": {
                 f"bot{c + 1}": l
                 for c, (_, l) in enumerate(
                     sorted(work_loads.items(), key=lambda x: x[1], reverse=True)
                 )
-            } if work_loads else {}
+            } if work_loads else {},
+            "dc_throughput": dc_throughput.snapshot(),
+            "chunk_cache": chunk_cache.stats(),
+            "stream_limits": stream_limiter.stats()
         }
     except Exception as e:
-        return {"loads": {}}
+        return {"loads": {}, "dc_throughput": {}, "chunk_cache": {}, "stream_limits": {}}
+
+
+@app.get("/api/system/indexes")
+async def get_indexes(_: bool = Depends(require_auth)):
+    from Backend import db
+    return {"indexes": await db.get_index_report()}
+
+@app.get("/api/streams")
+async def list_streams(_: bool = Depends(require_auth)):
+    from Backend.helper.active_streams import stream_registry
+    streams = stream_registry.list()
+    return {
+        "count": len(streams),
+        "bytes_per_second": sum(s["bytes_per_second"] for s in streams),
+        "streams": streams
+    }
+
+@app.delete("/api/streams/{stream_id}")
+async def terminate_stream(stream_id: str, _: bool = Depends(require_auth)):
+    from Backend.helper.active_streams import stream_registry
+    if not stream_registry.terminate(stream_id):
+        raise HTTPException(status_code=404, detail="Stream not found")
+    return {"success": True}
+
+@app.get("/api/system/mirror")
+async def get_mirror(_: bool = Depends(require_auth)):
+    from Backend.helper.mirror import mirror_tier
+    return {"enabled": Telegram.MIRROR_ENABLED, **mirror_tier.stats(), "mirrored": mirror_tier.list()}
+
+@app.post("/api/system/mirror/pin")
+async def pin_mirror(unique_id: str, pinned: bool = True, _: bool = Depends(require_auth)):
+    from Backend.helper.mirror import mirror_tier
+    if not await mirror_tier.pin(unique_id, pinned):
+        raise HTTPException(status_code=404, detail="File is neither mirrored nor a known candidate")
+    return {"success": True}
+
+@app.delete("/api/system/mirror/evict")
+async def evict_mirror(unique_id: str, _: bool = Depends(require_auth)):
+    from Backend.helper.mirror import mirror_tier
+    if not await mirror_tier.evict(unique_id):
+        raise HTTPException(status_code=404, detail="File is not mirrored")
+    return {"success": True}
 
 
 @app.exception_handler(401)
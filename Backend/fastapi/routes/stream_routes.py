@@ -1,18 +1,48 @@
 import math
 import secrets
 import mimetypes
-from typing import Tuple
+from collections import OrderedDict
+from typing import Optional, Tuple
 from fastapi import APIRouter, Request, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 
+from Backend import db
+from Backend.config import Telegram
 from Backend.helper.encrypt import decode_string
 from Backend.helper.exceptions import InvalidHash
-from Backend.helper.custom_dl import ByteStreamer
-from Backend.pyrofork.bot import StreamBot, work_loads, multi_clients
+from Backend.helper.chunk_cache import CHUNK_SIZE
+from Backend.helper.custom_dl import class_cache, get_byte_streamer
+from Backend.helper.affinity import select_client
+from Backend.helper.active_streams import ActiveStream, stream_registry
+from Backend.helper.stream_limits import StreamLease, stream_limiter
+from Backend.helper.binge import track_binge
+from Backend.helper.mirror import MirrorFileResponse, mirror_tier
+from Backend.pyrofork.bot import StreamBot, multi_clients
 from Backend.logger import LOGGER
 
 router = APIRouter(tags=["Streaming"])
-class_cache = {}
+file_details_cache: "OrderedDict[str, dict]" = OrderedDict()
+FILE_DETAILS_CACHE_SIZE = 2048
+
+
+async def get_file_details(id: str) -> Optional[dict]:
+    details = file_details_cache.get(id)
+    if details is not None:
+        file_details_cache.move_to_end(id)
+        return details
+
+    try:
+        details = await db.get_file_details(id)
+    except Exception as e:
+        LOGGER.error(f"Error reading stored file details: {e}")
+        return None
+
+    if details and details.get("file_unique_id"):
+        file_details_cache[id] = details
+        if len(file_details_cache) > FILE_DETAILS_CACHE_SIZE:
+            file_details_cache.popitem(last=False)
+        return details
+    return None
 
 
 def parse_range_header(range_header: str, file_size: int) -> Tuple[int, int]:
@@ -36,50 +66,143 @@ def parse_range_header(range_header: str, file_size: int) -> Tuple[int, int]:
     return from_bytes, until_bytes
 
 
-@router.get("/dl/{id}/{name}")
+def build_stream_headers(
+    file_name: Optional[str], mime_type: Optional[str], file_size: int,
+    from_bytes: int, until_bytes: int, range_header: str
+) -> Tuple[dict, int]:
+    resolved_name = file_name or f"{secrets.token_hex(2)}.unknown"
+    mime_type = mime_type or mimetypes.guess_type(resolved_name)[0] or "application/octet-stream"
+    if not file_name and "/" in mime_type:
+        resolved_name = f"{secrets.token_hex(2)}.{mime_type.split('/')[1]}"
+
+    headers = {
+        "Content-Type": mime_type,
+        "Content-Disposition": f'inline; filename="{resolved_name}"',
+        "Content-Length": str(until_bytes - from_bytes + 1),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "public, max-age=3600, immutable",
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Expose-Headers": "Content-Length, Content-Range, Accept-Ranges",
+    }
+
+    if range_header:
+        headers["Content-Range"] = f"bytes {from_bytes}-{until_bytes}/{file_size}"
+        return headers, 206
+    return headers, 200
+
+
+def find_cached_file_id(chat_id: int, msg_id: int):
+    for tg_connect in class_cache.values():
+        file_id = tg_connect.get_cached_file_id(chat_id, msg_id)
+        if file_id:
+            return file_id
+    return None
+
+
+def serve_mirrored(
+    path: str, file_id, file_size: int, from_bytes: int, until_bytes: int, range_header: str
+) -> MirrorFileResponse:
+    headers, _ = build_stream_headers(
+        file_id.file_name, file_id.mime_type, file_size, from_bytes, until_bytes, range_header
+    )
+    # FileResponse computes Content-Length/Content-Range itself and answers the Range header.
+    headers.pop("Content-Length")
+    headers.pop("Content-Range", None)
+    return MirrorFileResponse(path, headers=headers, media_type=headers["Content-Type"])
+
+
 @router.head("/dl/{id}/{name}")
+async def stream_head_handler(request: Request, id: str, name: str):
+    # Players probe sizes constantly; answer from stored or cached metadata without MTProto traffic.
+    try:
+        decoded_data = await decode_string(id)
+        if not decoded_data.get("msg_id"):
+            raise HTTPException(status_code=400, detail="Missing id")
+        chat_id = int(f"-100{decoded_data['chat_id']}")
+        msg_id = int(decoded_data["msg_id"])
+
+        details = await get_file_details(id)
+        if details and details.get("file_size") and "file_name" in details:
+            file_name, mime_type, file_size = details["file_name"], details.get("mime_type"), details["file_size"]
+        elif file_id := find_cached_file_id(chat_id, msg_id):
+            file_name, mime_type, file_size = file_id.file_name, file_id.mime_type, file_id.file_size
+        else:
+            # Nothing stored yet (pre-backfill document): resolve once, which also warms the cache.
+            return await stream_handler(request, id, name)
+
+        range_header = request.headers.get("Range", "")
+        from_bytes, until_bytes = parse_range_header(range_header, file_size)
+        headers, status_code = build_stream_headers(
+            file_name, mime_type, file_size, from_bytes, until_bytes, range_header
+        )
+        return Response(status_code=status_code, headers=headers, media_type=headers["Content-Type"])
+    except HTTPException:
+        raise
+    except Exception as e:
+        LOGGER.error(f"Error in stream_head_handler: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error retrieving file: {str(e)}")
+
+
+@router.get("/dl/{id}/{name}")
 async def stream_handler(request: Request, id: str, name: str):
+    lease = None
     try:
         decoded_data = await decode_string(id)
         if not decoded_data.get("msg_id"):
             LOGGER.error(f"Missing msg_id in decoded data: {decoded_data}")
             raise HTTPException(status_code=400, detail="Missing id")
 
+        if request.method.upper() != "HEAD":
+            # Over-limit clients are refused before they cost a get_messages or GetFile.
+            lease = stream_limiter.acquire(
+                request.query_params.get("token") or request.headers.get("X-Stream-Token"),
+                request.client.host if request.client else "unknown",
+            )
+
         chat_id = f"-100{decoded_data['chat_id']}"
         msg_id = int(decoded_data["msg_id"])
-        
-        LOGGER.info(f"Fetching message {msg_id} from channel {chat_id}")
-        message = await StreamBot.get_messages(int(chat_id), msg_id)
-        
-        # Check if message exists
-        if not message:
-            LOGGER.error(f"Message {msg_id} not found in channel {chat_id}")
-            raise HTTPException(
-                status_code=404, 
-                detail=f"Message {msg_id} not found in channel {chat_id}"
-            )
-        
-        # Check if file exists in message
-        file = message.video or message.document
-        if not file:
-            LOGGER.error(f"No video or document found in message {msg_id} (channel {chat_id})")
-            raise HTTPException(
-                status_code=404, 
-                detail=f"No video or document found in message {msg_id}"
-            )
-        
-        file_hash = file.file_unique_id[:6]
-        LOGGER.info(f"Streaming file from message {msg_id}: {file.file_name if hasattr(file, 'file_name') else 'unknown'}")
+
+        details = await get_file_details(id)
+        if details:
+            file_hash = details["file_unique_id"][:6]
+        else:
+            LOGGER.info(f"Fetching message {msg_id} from channel {chat_id}")
+            message = await StreamBot.get_messages(int(chat_id), msg_id)
+            
+            # Check if message exists
+            if not message:
+                LOGGER.error(f"Message {msg_id} not found in channel {chat_id}")
+                raise HTTPException(
+                    status_code=404, 
+                    detail=f"Message {msg_id} not found in channel {chat_id}"
+                )
+            
+            # Check if file exists in message
+            file = message.video or message.document
+            if not file:
+                LOGGER.error(f"No video or document found in message {msg_id} (channel {chat_id})")
+                raise HTTPException(
+                    status_code=404, 
+                    detail=f"No video or document found in message {msg_id}"
+                )
+            
+            file_hash = file.file_unique_id[:6]
+            LOGGER.info(f"Streaming file from message {msg_id}: {file.file_name if hasattr(file, 'file_name') else 'unknown'}")
 
         return await media_streamer(
             request,
             chat_id=int(chat_id),
             id=msg_id,
-            secure_hash=file_hash
+            secure_hash=file_hash,
+            details=details,
+            quality_id=id,
+            lease=lease
         )
     except HTTPException:
+        stream_limiter.release(lease)
         raise
     except Exception as e:
+        stream_limiter.release(lease)
         LOGGER.error(f"Error in stream_handler: {str(e)}")
         raise HTTPException(
             status_code=500, 
@@ -92,63 +215,62 @@ async def media_streamer(
     chat_id: int,
     id: int,
     secure_hash: str,
+    details: Optional[dict] = None,
+    quality_id: Optional[str] = None,
+    lease: Optional[StreamLease] = None,
 ) -> StreamingResponse:
     range_header = request.headers.get("Range", "")
-    index = min(work_loads, key=work_loads.get)
+    index = select_client(f"{chat_id}:{id}")
     faster_client = multi_clients[index]
+    tg_connect = get_byte_streamer(faster_client)
 
-    tg_connect = class_cache.get(faster_client)
-    if not tg_connect:
-        tg_connect = ByteStreamer(faster_client)
-        class_cache[faster_client] = tg_connect
-
-    file_id = await tg_connect.get_file_properties(chat_id=chat_id, message_id=id)
+    file_id = await tg_connect.get_file_properties(chat_id=chat_id, message_id=id, details=details)
     if file_id.unique_id[:6] != secure_hash:
         raise InvalidHash
 
     file_size = file_id.file_size
     from_bytes, until_bytes = parse_range_header(range_header, file_size)
 
-    chunk_size = 1024 * 1024
+    if Telegram.MIRROR_ENABLED:
+        if request.method.upper() == "GET" and from_bytes == 0:
+            mirror_tier.record_play(file_id)
+        if mirror_path := mirror_tier.lookup(file_id.unique_id):
+            stream_limiter.release(lease)
+            return serve_mirrored(mirror_path, file_id, file_size, from_bytes, until_bytes, range_header)
+
+    chunk_size = CHUNK_SIZE
     offset = from_bytes - (from_bytes % chunk_size)
     first_part_cut = from_bytes - offset
     last_part_cut = (until_bytes % chunk_size) + 1
-    req_length = until_bytes - from_bytes + 1
     part_count = math.ceil(until_bytes / chunk_size) - math.floor(offset / chunk_size)
 
-    body = tg_connect.yield_file(
-        file_id, index, offset, first_part_cut, last_part_cut, part_count, chunk_size
+    headers, status_code = build_stream_headers(
+        file_id.file_name, file_id.mime_type, file_size, from_bytes, until_bytes, range_header
     )
 
-    file_name = file_id.file_name or f"{secrets.token_hex(2)}.unknown"
-    mime_type = file_id.mime_type or mimetypes.guess_type(file_name)[0] or "application/octet-stream"
-    if not file_id.file_name and "/" in mime_type:
-        file_name = f"{secrets.token_hex(2)}.{mime_type.split('/')[1]}"
-
-    headers = {
-        "Content-Type": mime_type,
-                "Content-Disposition": f'inline; filename="{file_name}"',
-        "Accept-Ranges": "bytes",
-        "Cache-Control": "public, max-age=3600, immutable",
-        "Access-Control-Allow-Origin": "*",
-        "Access-Control-Expose-Headers": "Content-Length, Content-Range, Accept-Ranges",
-    }
-    
-    if range_header:
-        headers["Content-Range"] = f"bytes {from_bytes}-{until_bytes}/{file_size}"
-        status_code = 206
-    else:
-        status_code = 200
-    
-    
     # If this is a HEAD request, return headers only without a body to avoid protocol mismatches.
     if request.method.upper() == "HEAD":
-        from starlette.responses import Response
-        return Response(status_code=status_code, headers=headers, media_type=mime_type)
+        return Response(status_code=status_code, headers=headers, media_type=headers["Content-Type"])
+
+    # Uvicorn already rewrites client.host from X-Forwarded-For sent by trusted proxies (FORWARDED_ALLOW_IPS).
+    client_ip = request.client.host if request.client else "unknown"
+
+    body = tg_connect.yield_file(
+        file_id, index, offset, first_part_cut, last_part_cut, part_count, chunk_size
+    )
+    if Telegram.BINGE_PREFETCH and quality_id:
+        body = track_binge(body, quality_id, from_bytes, file_size)
+    if lease:
+        body = stream_limiter.limit(body, lease)
+    stream = ActiveStream(
+        file_id.file_name, file_id.unique_id, file_size, from_bytes, until_bytes,
+        index, file_id.dc_id, client_ip
+    )
+    body = stream_registry.track(body, stream)
 
     return StreamingResponse(
         status_code=status_code,
         content=body,
         headers=headers,
-        media_type=mime_type,
+        media_type=headers["Content-Type"],
     )
\ No newline at end of file
@@ -3,6 +3,9 @@ from typing import Optional
 from urllib.parse import unquote
 from Backend.config import Telegram
 from Backend import db, __version__
+from Backend.helper.dc_stats import dc_throughput, playback_margin, quality_rank
+from Backend.helper.pyro import get_readable_file_size
+from Backend.helper.warmup import schedule_warmup
 
 # --- Configuration ---
 BASE_URL = Telegram.BASE_URL
@@ -145,10 +148,11 @@ async def get_catalog(media_type: str, id: str, extra: Optional[str] = None):
     
     try:
         if search_query:
-            search_results = await db.search_documents(query=search_query, page=page, page_size=PAGE_SIZE)
-            all_items = search_results.get("results", [])
             db_media_type = "tv" if media_type == "series" else "movie"
-            items = [item for item in all_items if item.get("media_type") == db_media_type]
+            search_results = await db.search_documents(
+                query=search_query, page=page, page_size=PAGE_SIZE, media_type=db_media_type
+            )
+            items = search_results.get("results", [])
         else:
             if "latest" in id:
                 sort_params = [("updated_on", "desc")]
@@ -239,14 +243,33 @@ async def get_streams(media_type: str, id: str):
     if not media_details or "telegram" not in media_details:
         return {"streams": []}
     
-    streams = [
-        {
+    qualities = [quality for quality in media_details.get("telegram", []) if quality.get("id")]
+
+    def stream_rank(quality: dict):
+        margin = playback_margin(quality.get("file_size"), quality.get("dc_id"), media_type)
+        smooth = margin is None or margin >= 1
+        return (
+            smooth,
+            quality_rank(quality.get("quality")),
+            dc_throughput.get(quality.get("dc_id")) or 0,
+            -(quality.get("file_size") or 0)
+        )
+
+    ranked = sorted(qualities, key=stream_rank, reverse=True)
+    # Stremio asks for streams just before the user clicks play; warm the likely picks meanwhile.
+    schedule_warmup(ranked)
+
+    streams = []
+    for quality in ranked:
+        title = f"{quality.get('quality', 'HD')}\n💾 {quality.get('size', '')}"
+        dc_id = quality.get("dc_id")
+        if dc_id:
+            rate = dc_throughput.get(dc_id)
+            title += f"  ⚡ DC{dc_id} · {get_readable_file_size(int(rate))}/s" if rate else f"  📡 DC{dc_id}"
+        streams.append({
             "name": f"{quality.get('name', '')}",
-            "title": f"{quality.get('quality', 'HD')}\n💾 {quality.get('size', '')}",
+            "title": title,
             "url": f"{BASE_URL}/dl/{quality.get('id')}/video.mkv"
-        }
-        for quality in media_details.get("telegram", [])
-        if quality.get("id")
-    ]
+        })
     
     return {"streams": streams}
@@ -0,0 +1,86 @@
+import secrets
+from time import monotonic, time
+from typing import AsyncGenerator, Dict, List, Optional
+
+RATE_WINDOW = 2.0
+
+
+class ActiveStream:
+    def __init__(self, file_name: Optional[str], unique_id: str, file_size: int, from_bytes: int,
+                 until_bytes: int, client_index: int, dc_id: int, client_ip: str):
+        self.id = secrets.token_hex(6)
+        self.file_name = file_name
+        self.unique_id = unique_id
+        self.file_size = file_size
+        self.from_bytes = from_bytes
+        self.until_bytes = until_bytes
+        self.client_index = client_index
+        self.dc_id = dc_id
+        self.client_ip = client_ip
+        self.started_at = time()
+        self.bytes_sent = 0
+        self.rate = 0.0
+        self.terminated = False
+        self._window_start = monotonic()
+        self._window_bytes = 0
+
+    def record(self, nbytes: int):
+        self.bytes_sent += nbytes
+        self._window_bytes += nbytes
+        now = monotonic()
+        if now - self._window_start >= RATE_WINDOW:
+            self.rate = self._window_bytes / (now - self._window_start)
+            self._window_start, self._window_bytes = now, 0
+
+    def current_rate(self) -> float:
+        # A stalled stream stops calling record(), so fold the idle time into the reported rate.
+        elapsed = monotonic() - self._window_start
+        if elapsed >= RATE_WINDOW:
+            return self._window_bytes / elapsed
+        return self.rate
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "file_name": self.file_name,
+            "file_unique_id": self.unique_id,
+            "file_size": self.file_size,
+            "range": [self.from_bytes, self.until_bytes],
+            "client": f"bot{self.client_index + 1}",
+            "dc_id": self.dc_id,
+            "client_ip": self.client_ip,
+            "started_at": self.started_at,
+            "bytes_sent": self.bytes_sent,
+            "bytes_per_second": round(self.current_rate()),
+        }
+
+
+class StreamRegistry:
+    def __init__(self):
+        self.streams: Dict[str, ActiveStream] = {}
+
+    def terminate(self, stream_id: str) -> bool:
+        stream = self.streams.get(stream_id)
+        if not stream:
+            return False
+        stream.terminated = True
+        return True
+
+    def list(self) -> List[dict]:
+        return sorted((s.to_dict() for s in self.streams.values()), key=lambda s: s["started_at"])
+
+    async def track(self, body: AsyncGenerator, stream: ActiveStream):
+        # Registered only once the body starts: a client that leaves before that never runs the finally.
+        self.streams[stream.id] = stream
+        try:
+            async for chunk in body:
+                if stream.terminated:
+                    break
+                stream.record(len(chunk))
+                yield chunk
+        finally:
+            self.streams.pop(stream.id, None)
+            await body.aclose()
+
+
+stream_registry = StreamRegistry()
@@ -0,0 +1,44 @@
+from hashlib import blake2b
+from time import time
+from typing import Dict, List
+from Backend.config import Telegram
+from Backend.logger import LOGGER
+from Backend.pyrofork.bot import multi_clients, work_loads
+
+throttled_until: Dict[int, float] = {}
+
+
+def _weight(file_key: str, index: int) -> int:
+    return int.from_bytes(blake2b(f"{file_key}:{index}".encode(), digest_size=8).digest(), "big")
+
+
+def rank_clients(file_key: str) -> List[int]:
+    # Rendezvous hashing: every file gets a stable preference order over the bots,
+    # and adding or removing a bot only remaps the files that preferred it.
+    return sorted(
+        (index for index in work_loads if index in multi_clients),
+        key=lambda index: _weight(file_key, index),
+        reverse=True
+    )
+
+
+def is_throttled(index: int) -> bool:
+    return throttled_until.get(index, 0) > time()
+
+
+def mark_throttled(index: int, seconds: float):
+    throttled_until[index] = max(throttled_until.get(index, 0), time() + seconds)
+    LOGGER.warning(f"Client {index} throttled for {seconds}s, routing streams elsewhere.")
+
+
+def select_client(file_key: str) -> int:
+    if not Telegram.CLIENT_AFFINITY:
+        return min(work_loads, key=work_loads.get)
+
+    ranked = rank_clients(file_key)
+    candidates = [index for index in ranked if not is_throttled(index)] or ranked
+    least_load = min(work_loads[index] for index in candidates)
+    for index in candidates:
+        if work_loads[index] <= least_load + Telegram.AFFINITY_LOAD_MARGIN:
+            return index
+    return candidates[0]
@@ -0,0 +1,77 @@
+from asyncio import sleep as asleep
+from pyrogram.errors import FloodWait
+from Backend import db
+from Backend.logger import LOGGER
+from Backend.helper.encrypt import decode_string
+from Backend.helper.pyro import get_media_properties, is_media
+from Backend.pyrofork.bot import StreamBot
+
+BATCH_SIZE = 200
+
+
+def iter_qualities(doc: dict):
+    if "seasons" in doc:
+        for season in doc.get("seasons", []):
+            for episode in season.get("episodes", []):
+                yield from episode.get("telegram") or []
+    else:
+        yield from doc.get("telegram") or []
+
+
+async def _collect_pending() -> dict:
+    pending = {}
+    total_storage_dbs = len(db.dbs) - 1
+    for db_index in range(1, total_storage_dbs + 1):
+        db_key = f"storage_{db_index}"
+        for collection_name, projection in (("movie", {"telegram": 1}), ("tv", {"seasons.episodes.telegram": 1})):
+            async for doc in db.dbs[db_key][collection_name].find({}, projection):
+                for quality in iter_qualities(doc):
+                    if quality.get("file_unique_id") and quality.get("file_ids") and "file_name" in quality:
+                        continue
+                    try:
+                        decoded = await decode_string(quality["id"])
+                        chat_id = int(f"-100{decoded['chat_id']}")
+                        pending.setdefault(chat_id, {})[int(decoded["msg_id"])] = quality["id"]
+                    except Exception as e:
+                        LOGGER.error(f"Backfill skipped undecodable quality in {db_key}: {e}")
+    return pending
+
+
+async def backfill_file_properties():
+    try:
+        pending = await _collect_pending()
+        if not pending:
+            LOGGER.info("File properties backfill: nothing to do.")
+            return
+
+        total = sum(len(messages) for messages in pending.values())
+        LOGGER.info(f"File properties backfill started for {total} files.")
+        updated = 0
+        for chat_id, messages in pending.items():
+            msg_ids = list(messages)
+            for i in range(0, len(msg_ids), BATCH_SIZE):
+                batch = msg_ids[i:i + BATCH_SIZE]
+                while True:
+                    try:
+                        fetched = await StreamBot.get_messages(chat_id, batch)
+                        break
+                    except FloodWait as e:
+                        LOGGER.warning(f"Backfill FloodWait: {e.value}s")
+                        await asleep(e.value)
+
+                for message in fetched if isinstance(fetched, list) else [fetched]:
+                    if not message or message.empty:
+                        continue
+                    media = is_media(message)
+                    if not media:
+                        continue
+                    properties = get_media_properties(StreamBot, media)
+                    for bot_id, file_id in properties.pop("file_ids").items():
+                        properties[f"file_ids.{bot_id}"] = file_id
+                    if await db.update_file_details(messages[message.id], properties):
+                        updated += 1
+                await asleep(1)
+
+        LOGGER.info(f"File properties backfill finished: {updated}/{total} files updated.")
+    except Exception as e:
+        LOGGER.error(f"File properties backfill failed: {e}")
@@ -0,0 +1,39 @@
+from asyncio import create_task
+from time import time
+from typing import AsyncGenerator, Dict
+from Backend import db
+from Backend.config import Telegram
+from Backend.logger import LOGGER
+from Backend.helper.chunk_cache import CHUNK_SIZE
+from Backend.helper.warmup import warm_quality
+
+BINGE_COOLDOWN = 30 * 60
+recently_prefetched: Dict[str, float] = {}
+
+
+async def prefetch_next_episode(quality_id: str):
+    try:
+        next_quality = await db.get_next_episode_quality(quality_id)
+        if not next_quality or not next_quality.get("id"):
+            return
+        offsets = [i * CHUNK_SIZE for i in range(Telegram.BINGE_PREFETCH_CHUNKS)]
+        LOGGER.info(f"Binge prefetch: warming next episode ({next_quality.get('quality')}) after {quality_id[:12]}")
+        await warm_quality(next_quality, offsets)
+    except Exception as e:
+        LOGGER.error(f"Binge prefetch failed: {e}")
+
+
+async def track_binge(body: AsyncGenerator, quality_id: str, position: int, file_size: int):
+    threshold = file_size * Telegram.BINGE_PREFETCH_FRACTION
+    triggered = position >= threshold
+    async for chunk in body:
+        position += len(chunk)
+        if not triggered and position >= threshold:
+            triggered = True
+            now = time()
+            if now - recently_prefetched.get(quality_id, 0) >= BINGE_COOLDOWN:
+                for key in [k for k, prefetched_at in recently_prefetched.items() if now - prefetched_at >= BINGE_COOLDOWN]:
+                    del recently_prefetched[key]
+                recently_prefetched[quality_id] = now
+                create_task(prefetch_next_episode(quality_id))
+        yield chunk
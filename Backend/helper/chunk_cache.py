@@ -0,0 +1,286 @@
+import mmap
+import os
+import struct
+from collections import OrderedDict
+from fcntl import LOCK_EX, LOCK_SH, LOCK_UN, lockf
+from hashlib import blake2b
+from typing import List, Optional, Tuple
+from Backend.config import Telegram
+from Backend.helper.file_hashes import MAX_CHUNK_HASHES, HashRange
+from Backend.logger import LOGGER
+
+CHUNK_SIZE = 1024 * 1024
+ChunkKey = Tuple[str, int]
+
+
+class ChunkCache:
+    # Chunks die with the process, so they are never verified against GetFileHashes.
+    verifiable = False
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.chunks: "OrderedDict[ChunkKey, bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, unique_id: str, offset: int) -> Optional[bytes]:
+        chunk = self.chunks.get((unique_id, offset))
+        if chunk is None:
+            self.misses += 1
+            return None
+        self.chunks.move_to_end((unique_id, offset))
+        self.hits += 1
+        return chunk
+
+    def contains(self, unique_id: str, offset: int) -> bool:
+        return (unique_id, offset) in self.chunks
+
+    def recent_keys(self, limit: int) -> List[ChunkKey]:
+        return list(self.chunks.keys())[-limit:]
+
+    def discard(self, unique_id: str, offset: int):
+        chunk = self.chunks.pop((unique_id, offset), None)
+        if chunk is not None:
+            self.size -= len(chunk)
+
+    def put(self, unique_id: str, offset: int, chunk: bytes):
+        if not chunk or len(chunk) > self.max_bytes:
+            return
+        key = (unique_id, offset)
+        if key in self.chunks:
+            self.size -= len(self.chunks.pop(key))
+        self.chunks[key] = chunk
+        self.size += len(chunk)
+        while self.size > self.max_bytes:
+            _, evicted = self.chunks.popitem(last=False)
+            self.size -= len(evicted)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "chunks": len(self.chunks),
+            "size": self.size,
+            "max_size": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class SharedChunkCache:
+    """
+    Host-wide chunk cache in a shared-memory file, so every process serving /dl on the host
+    fetches a hot chunk from Telegram once.
+    The file is split into fixed 1 MiB slots grouped into sets of SET_WAYS. A key hashes to
+    one set; each set has its own fcntl byte-range lock and its own clock hand, so processes
+    only contend when they touch the same set. Each slot also holds the chunk's GetFileHashes
+    ranges, so verification survives a restart along with the chunk.
+    """
+
+    MAGIC = b"TGSCHNK2"
+    NO_HASHES = 0xFF                        # hash count marking a chunk whose hashes could not be fetched
+    verifiable = True
+    SET_WAYS = 8
+    HEADER = struct.Struct("<8sIII")        # magic, sets, ways, chunk size
+    ENTRY = struct.Struct("<16sIBBB1x")     # key digest, length, referenced, valid, hash count
+    HASH = struct.Struct("<II32s")          # offset within the chunk, limit, sha256
+    HAND = struct.Struct("<I")
+    PAGE = 4096
+
+    def __init__(self, path: str, max_bytes: int):
+        self.sets = max(1, max_bytes // CHUNK_SIZE // self.SET_WAYS)
+        self.slots = self.sets * self.SET_WAYS
+        # Layout and size are part of the name: processes with another geometry get their own
+        # segment instead of resizing one that others have mapped (a shrink would SIGBUS them).
+        self.path = f"{path}-{self.MAGIC.decode().lower()}-{self.slots}"
+        self.hands_offset = self.PAGE
+        self.entries_offset = self.hands_offset + self.sets * self.HAND.size
+        self.hashes_offset = self.entries_offset + self.slots * self.ENTRY.size
+        data_offset = self.hashes_offset + self.slots * MAX_CHUNK_HASHES * self.HASH.size
+        self.data_offset = data_offset + (-data_offset % self.PAGE)
+        self.total_size = self.data_offset + self.slots * CHUNK_SIZE
+        self.max_bytes = self.slots * CHUNK_SIZE
+        self.hits = 0
+        self.misses = 0
+
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self.attach()
+        except Exception:
+            os.close(self.fd)
+            raise
+
+    def attach(self):
+        self.lock(self.sets, LOCK_EX)
+        try:
+            size = os.fstat(self.fd).st_size
+            if size == 0:
+                os.ftruncate(self.fd, self.total_size)
+            elif size != self.total_size:
+                raise ValueError(f"{self.path} is {size} bytes, expected {self.total_size}")
+            self.mm = mmap.mmap(self.fd, self.total_size)
+            header = self.HEADER.pack(self.MAGIC, self.sets, self.SET_WAYS, CHUNK_SIZE)
+            current = self.mm[:self.HEADER.size]
+            if current == bytes(self.HEADER.size):
+                # Fresh segment: the index is already zeroed, only the header is missing.
+                self.mm[:self.HEADER.size] = header
+            elif current != header:
+                self.mm.close()
+                raise ValueError(f"{self.path} has an unexpected header")
+        finally:
+            self.lock(self.sets, LOCK_UN)
+
+    def lock(self, set_index: int, mode: int):
+        os.lseek(self.fd, set_index, os.SEEK_SET)
+        lockf(self.fd, mode, 1)
+
+    def locate(self, unique_id: str, offset: int) -> Tuple[bytes, int]:
+        digest = blake2b(f"{unique_id}:{offset}".encode(), digest_size=16).digest()
+        return digest, int.from_bytes(digest[:8], "little") % self.sets
+
+    def entry_offset(self, slot: int) -> int:
+        return self.entries_offset + slot * self.ENTRY.size
+
+    def find(self, digest: bytes, set_index: int) -> Optional[int]:
+        for slot in range(set_index * self.SET_WAYS, (set_index + 1) * self.SET_WAYS):
+            key, _, _, valid, _ = self.ENTRY.unpack_from(self.mm, self.entry_offset(slot))
+            if valid and key == digest:
+                return slot
+        return None
+
+    def get(self, unique_id: str, offset: int) -> Optional[bytes]:
+        digest, set_index = self.locate(unique_id, offset)
+        self.lock(set_index, LOCK_SH)
+        try:
+            slot = self.find(digest, set_index)
+            if slot is None:
+                self.misses += 1
+                return None
+            _, length, _, _, _ = self.ENTRY.unpack_from(self.mm, self.entry_offset(slot))
+            start = self.data_offset + slot * CHUNK_SIZE
+            chunk = self.mm[start:start + length]
+            # Setting the reference bit is a single byte store; a racing clock sweep at worst evicts it anyway.
+            self.mm[self.entry_offset(slot) + 20] = 1
+        finally:
+            self.lock(set_index, LOCK_UN)
+        self.hits += 1
+        return chunk
+
+    def contains(self, unique_id: str, offset: int) -> bool:
+        digest, set_index = self.locate(unique_id, offset)
+        self.lock(set_index, LOCK_SH)
+        try:
+            return self.find(digest, set_index) is not None
+        finally:
+            self.lock(set_index, LOCK_UN)
+
+    def put(self, unique_id: str, offset: int, chunk: bytes):
+        if not chunk or len(chunk) > CHUNK_SIZE:
+            return
+        digest, set_index = self.locate(unique_id, offset)
+        self.lock(set_index, LOCK_EX)
+        try:
+            slot = self.find(digest, set_index)
+            if slot is None:
+                slot = self.evict(set_index)
+            # Invalidate before copying so a writer dying mid-copy leaves an empty slot, not a stale key.
+            self.mm[self.entry_offset(slot) + 21] = 0
+            start = self.data_offset + slot * CHUNK_SIZE
+            self.mm[start:start + len(chunk)] = chunk
+            self.ENTRY.pack_into(self.mm, self.entry_offset(slot), digest, len(chunk), 1, 1, 0)
+        finally:
+            self.lock(set_index, LOCK_UN)
+
+    def recent_keys(self, limit: int) -> List[ChunkKey]:
+        # Chunks live in /dev/shm and survive a process restart on their own.
+        return []
+
+    def discard(self, unique_id: str, offset: int):
+        digest, set_index = self.locate(unique_id, offset)
+        self.lock(set_index, LOCK_EX)
+        try:
+            slot = self.find(digest, set_index)
+            if slot is not None:
+                self.mm[self.entry_offset(slot) + 21] = 0
+        finally:
+            self.lock(set_index, LOCK_UN)
+
+    def get_hashes(self, unique_id: str, offset: int) -> Optional[List[HashRange]]:
+        digest, set_index = self.locate(unique_id, offset)
+        self.lock(set_index, LOCK_SH)
+        try:
+            slot = self.find(digest, set_index)
+            if slot is None:
+                return None
+            hash_count = self.mm[self.entry_offset(slot) + 22]
+            if not hash_count:
+                return None
+            if hash_count == self.NO_HASHES:
+                return []
+            start = self.hashes_offset + slot * MAX_CHUNK_HASHES * self.HASH.size
+            return [
+                (offset + relative, limit, sha)
+                for relative, limit, sha in self.HASH.iter_unpack(self.mm[start:start + hash_count * self.HASH.size])
+            ]
+        finally:
+            self.lock(set_index, LOCK_UN)
+
+    def set_hashes(self, unique_id: str, offset: int, ranges: List[HashRange]):
+        """An empty ranges list records that no hashes are available, so the lookup is not repeated."""
+        if len(ranges) > MAX_CHUNK_HASHES:
+            ranges = []
+        digest, set_index = self.locate(unique_id, offset)
+        self.lock(set_index, LOCK_EX)
+        try:
+            slot = self.find(digest, set_index)
+            if slot is None:
+                return
+            start = self.hashes_offset + slot * MAX_CHUNK_HASHES * self.HASH.size
+            for i, (range_offset, limit, sha) in enumerate(ranges):
+                self.HASH.pack_into(self.mm, start + i * self.HASH.size, range_offset - offset, limit, sha)
+            self.mm[self.entry_offset(slot) + 22] = len(ranges) or self.NO_HASHES
+        finally:
+            self.lock(set_index, LOCK_UN)
+
+    def evict(self, set_index: int) -> int:
+        hand_offset = self.hands_offset + set_index * self.HAND.size
+        (hand,) = self.HAND.unpack_from(self.mm, hand_offset)
+        first = set_index * self.SET_WAYS
+        # Clock: clear reference bits until an unreferenced (or empty) slot comes round.
+        while True:
+            slot = first + hand % self.SET_WAYS
+            hand = (hand + 1) % self.SET_WAYS
+            key, length, referenced, valid, hash_count = self.ENTRY.unpack_from(self.mm, self.entry_offset(slot))
+            if not valid or not referenced:
+                self.HAND.pack_into(self.mm, hand_offset, hand)
+                return slot
+            self.ENTRY.pack_into(self.mm, self.entry_offset(slot), key, length, 0, valid, hash_count)
+
+    def stats(self) -> dict:
+        chunks = size = 0
+        for slot in range(self.slots):
+            _, length, _, valid, _ = self.ENTRY.unpack_from(self.mm, self.entry_offset(slot))
+            if valid:
+                chunks += 1
+                size += length
+        return {
+            "backend": "shm",
+            "chunks": chunks,
+            "size": size,
+            "max_size": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def create_chunk_cache():
+    max_bytes = Telegram.CHUNK_CACHE_MB * 1024 * 1024
+    if Telegram.CHUNK_CACHE_BACKEND == "shm":
+        try:
+            return SharedChunkCache(Telegram.CHUNK_CACHE_SHM_PATH, max_bytes)
+        except Exception as e:
+            LOGGER.error(f"Shared chunk cache unavailable, using in-process cache: {e}")
+    return ChunkCache(max_bytes)
+
+
+chunk_cache = create_chunk_cache()
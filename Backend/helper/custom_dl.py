@@ -1,112 +1,343 @@
 import asyncio
 from pyrogram import utils, raw
-from pyrogram.errors import AuthBytesInvalid
+from pyrogram.errors import AuthBytesInvalid, FileReferenceExpired, FileReferenceInvalid, FloodWait
 from pyrogram.file_id import FileId, FileType, ThumbnailSource
 from pyrogram.session import Session, Auth
-from typing import Dict, Union
+from time import monotonic
+from typing import Dict, List, Optional, Tuple, Union
+from Backend import db
+from Backend.config import Telegram
 from Backend.logger import LOGGER
+from Backend.helper.affinity import mark_throttled
+from Backend.helper.chunk_cache import chunk_cache
+from Backend.helper.dc_stats import dc_throughput
 from Backend.helper.exceptions import FIleNotFound
-from Backend.helper.pyro import get_file_ids
+from Backend.helper import file_hashes
+from Backend.helper.hedging import get_latency_tracker, hedge_budget, hedge_stats
+from Backend.helper.media_session import MediaSession
+from Backend.helper.pyro import file_id_from_details, get_file_ids
 from Backend.pyrofork.bot import work_loads
 from pyrogram import Client, utils, raw
 
+class_cache = {}
+
+
+def record_latency(task: asyncio.Task, tracker, started: float):
+    if not task.cancelled() and task.exception() is None:
+        tracker.record(monotonic() - started)
+
+
+def get_byte_streamer(client: Client) -> "ByteStreamer":
+    tg_connect = class_cache.get(client)
+    if not tg_connect:
+        tg_connect = ByteStreamer(client)
+        class_cache[client] = tg_connect
+    return tg_connect
+
 
 class ByteStreamer:
+    instances: List["ByteStreamer"] = []
+
     def __init__(self, client: Client):
         self.clean_timer = 30 * 60
         self.client: Client = client
-        self.__cached_file_ids: Dict[int, FileId] = {}
+        self.__cached_file_ids: Dict[Tuple[int, int], FileId] = {}
+        self.session_pools: Dict[int, List[Session]] = {}
+        self.session_loads: Dict[Session, int] = {}
+        self.session_locks: Dict[int, asyncio.Lock] = {}
+        ByteStreamer.instances.append(self)
         asyncio.create_task(self.clean_cache())
 
-    async def get_file_properties(self, chat_id: int, message_id: int) -> FileId:
-        if message_id not in self.__cached_file_ids:
-            file_id = await get_file_ids(self.client, int(chat_id), int(message_id))
+    async def get_file_properties(self, chat_id: int, message_id: int, details: Optional[dict] = None) -> FileId:
+        key = (int(chat_id), int(message_id))
+        if key not in self.__cached_file_ids:
+            file_id = file_id_from_details(details, self.client.me.id) if details else None
             if not file_id:
-                LOGGER.info('Message with ID %s not found!', message_id)
-                raise FIleNotFound
-            self.__cached_file_ids[message_id] = file_id
-        return self.__cached_file_ids[message_id]
+                file_id = await self.fetch_file_id(chat_id, message_id, details)
+            setattr(file_id, 'message_chat_id', int(chat_id))
+            setattr(file_id, 'message_id', int(message_id))
+            setattr(file_id, 'quality_id', details.get("id") if details else None)
+            self.__cached_file_ids[key] = file_id
+        return self.__cached_file_ids[key]
+
+    def get_cached_file_id(self, chat_id: int, message_id: int) -> Optional[FileId]:
+        return self.__cached_file_ids.get((int(chat_id), int(message_id)))
+
+    def cached_file_ids(self) -> List[FileId]:
+        return list(self.__cached_file_ids.values())
+
+    def seed_file_id(self, file_id: FileId):
+        self.__cached_file_ids.setdefault((file_id.message_chat_id, file_id.message_id), file_id)
+
+    async def fetch_file_id(self, chat_id: int, message_id: int, details: Optional[dict] = None) -> FileId:
+        file_id = await get_file_ids(self.client, int(chat_id), int(message_id))
+        if not file_id:
+            LOGGER.info('Message with ID %s not found!', message_id)
+            raise FIleNotFound
+        if details and details.get("id"):
+            asyncio.create_task(db.update_file_details(
+                details["id"], {f"file_ids.{self.client.me.id}": file_id.encode()}
+            ))
+        return file_id
+
+    async def refresh_location(self, file_id: FileId):
+        fresh = await get_file_ids(self.client, file_id.message_chat_id, file_id.message_id)
+        file_id.file_reference = fresh.file_reference
+        setattr(file_id, 'reference_refreshed', True)
+        if file_id.quality_id:
+            asyncio.create_task(db.update_file_details(
+                file_id.quality_id, {f"file_ids.{self.client.me.id}": fresh.encode()}
+            ))
 
     async def yield_file(self, file_id: FileId, index: int, offset: int, first_part_cut: int, last_part_cut: int, part_count: int, chunk_size: int) -> Union[str, None]: # type: ignore
-        client = self.client
         work_loads[index] += 1
         LOGGER.debug(f"Starting to yielding file with client {index}.")
-        media_session = await self.generate_media_session(client, file_id)
         current_part = 1
         location = await self.get_location(file_id)
         try:
-            r = await media_session.send(raw.functions.upload.GetFile(location=location, offset=offset, limit=chunk_size))
-            if isinstance(r, raw.types.upload.File):
-                while True:
-                    chunk = r.bytes
-                    if not chunk:
-                        break
-                    elif part_count == 1:
-                        yield chunk[first_part_cut:last_part_cut]
-                    elif current_part == 1:
-                        yield chunk[first_part_cut:]
-                    elif current_part == part_count:
-                        yield chunk[:last_part_cut]
-                    else:
-                        yield chunk
-
-                    current_part += 1
-                    offset += chunk_size
-
-                    if current_part > part_count:
-                        break
-                    
-                    r = await media_session.send(
-                        raw.functions.upload.GetFile(
-                            location=location, offset=offset, limit=chunk_size
-                        ),
-                    )
+            chunk = await self.get_chunk(location, file_id, offset, chunk_size)
+            while True:
+                if not chunk:
+                    break
+                elif part_count == 1:
+                    yield chunk[first_part_cut:last_part_cut]
+                elif current_part == 1:
+                    yield chunk[first_part_cut:]
+                elif current_part == part_count:
+                    yield chunk[:last_part_cut]
+                else:
+                    yield chunk
+
+                current_part += 1
+                offset += chunk_size
+
+                if current_part > part_count:
+                    break
+
+                chunk = await self.get_chunk(location, file_id, offset, chunk_size)
+        except (FileReferenceExpired, FileReferenceInvalid):
+            # Stored file_ids carry a file_reference that Telegram eventually rotates
+            if current_part == 1 and hasattr(file_id, 'message_id') and not getattr(file_id, 'reference_refreshed', False):
+                LOGGER.info(f"File reference expired for message {file_id.message_id}, refreshing.")
+                await self.refresh_location(file_id)
+                async for chunk in self.yield_file(file_id, index, offset, first_part_cut, last_part_cut, part_count, chunk_size):
+                    yield chunk
+        except FloodWait as e:
+            # Steer new playbacks away from this client, then abort: the response already
+            # promised an exact Content-Length, so ending quietly would hand out a truncated body.
+            mark_throttled(index, e.value)
+            raise
         except (TimeoutError, AttributeError):
             pass
         finally:
             LOGGER.debug("Finished yielding file with {current_part} parts.")
             work_loads[index] -= 1
 
-    async def generate_media_session(self, client: Client, file_id: FileId) -> Session:
-        media_session = client.media_sessions.get(file_id.dc_id, None)
-        if media_session is None:
-            if file_id.dc_id != await client.storage.dc_id():
-                media_session = Session(
-                    client,
-                    file_id.dc_id,
-                    await Auth(client, file_id.dc_id, await client.storage.test_mode()).create(),
-                    await client.storage.test_mode(),
-                    is_media=True,
+    async def get_chunk(self, location, file_id: FileId, offset: int, chunk_size: int, cache: bool = False) -> bytes:
+        cached = chunk_cache.get(file_id.unique_id, offset)
+        if cached is not None:
+            if not (Telegram.CHUNK_CACHE_VERIFY and chunk_cache.verifiable) or await self.verify_chunk(location, file_id, offset, chunk_size, cached):
+                return cached
+            LOGGER.warning(f"Discarding corrupt cached chunk at {offset} of {file_id.unique_id}")
+            chunk_cache.discard(file_id.unique_id, offset)
+
+        started = monotonic()
+        r = await self.fetch_chunk(location, file_id, offset, chunk_size)
+        if not isinstance(r, raw.types.upload.File):
+            return b""
+        dc_throughput.record(file_id.dc_id, len(r.bytes), monotonic() - started)
+
+        # Head and tail chunks are what every player probes first (container header, cues/moov).
+        if cache or offset == 0 or offset + chunk_size >= file_id.file_size:
+            chunk_cache.put(file_id.unique_id, offset, r.bytes)
+            if Telegram.CHUNK_CACHE_VERIFY and chunk_cache.verifiable and file_id.file_size:
+                asyncio.create_task(self.fetch_hashes(location, file_id, offset, len(r.bytes)))
+        return r.bytes
+
+    async def verify_chunk(self, location, file_id: FileId, offset: int, chunk_size: int, chunk: bytes) -> bool:
+        # Without a known size neither the length nor the hash ranges can be checked.
+        if not file_id.file_size:
+            return True
+        if len(chunk) != min(chunk_size, file_id.file_size - offset):
+            return False
+        ranges = chunk_cache.get_hashes(file_id.unique_id, offset)
+        if ranges is None:
+            ranges = await self.fetch_hashes(location, file_id, offset, len(chunk))
+        # Without hashes (RPC failed, recorded as []) the chunk is served unverified rather than refetched.
+        return not ranges or file_hashes.verify(chunk, offset, ranges)
+
+    async def fetch_hashes(self, location, file_id: FileId, offset: int, length: int):
+        try:
+            media_session = await self.generate_media_session(self.client, file_id)
+            hashes, position = {}, offset
+            while position < offset + length:
+                result = await self.send_tracked(
+                    media_session, raw.functions.upload.GetFileHashes(location=location, offset=position)
                 )
-                await media_session.start()
-                for _ in range(6):
-                    exported_auth = await client.invoke(raw.functions.auth.ExportAuthorization(dc_id=file_id.dc_id))
-                    try:
-                        
-                        await media_session.send(raw.functions.auth.ImportAuthorization(id=exported_auth.id, bytes=exported_auth.bytes))
-                        break
-                    except AuthBytesInvalid:
-                        LOGGER.debug(f"Invalid authorization bytes for DC {file_id.dc_id}, retrying...")
-                    except OSError:
-                        LOGGER.debug(f"Connection error, retrying...")
-                        await asyncio.sleep(2)
-                else:
-                    await media_session.stop()
-                    LOGGER.debug(f"Failed to establish media session for DC {file_id.dc_id} after multiple retries")
-                    return None 
+                if not result:
+                    break
+                for file_hash in result:
+                    hashes[file_hash.offset] = (file_hash.limit, file_hash.hash)
+                end = max(file_hash.offset + file_hash.limit for file_hash in result)
+                if end <= position:
+                    break
+                position = end
+            ranges = file_hashes.covering(hashes, offset, length) or []
+        except Exception as e:
+            LOGGER.debug(f"GetFileHashes failed for {file_id.unique_id} at {offset}: {e}")
+            ranges = []
+        chunk_cache.set_hashes(file_id.unique_id, offset, ranges)
+        return ranges
+
+    async def prefetch(self, file_id: FileId, offsets: List[int], chunk_size: int):
+        location = await self.get_location(file_id)
+        for offset in offsets:
+            if not chunk_cache.contains(file_id.unique_id, offset):
+                await self.get_chunk(location, file_id, offset, chunk_size, cache=True)
+
+    async def fetch_chunk(self, location, file_id: FileId, offset: int, chunk_size: int):
+        media_session = await self.generate_media_session(self.client, file_id)
+        request = raw.functions.upload.GetFile(location=location, offset=offset, limit=chunk_size)
+        if not Telegram.HEDGE_REQUESTS:
+            return await self.send_tracked(media_session, request)
+
+        tracker = get_latency_tracker(file_id.dc_id)
+        started = monotonic()
+        primary = asyncio.create_task(self.send_tracked(media_session, request))
+        # Every completed primary is a sample, however slow, so the p95 can rise above the threshold.
+        primary.add_done_callback(lambda task: record_latency(task, tracker, started))
+        done, _ = await asyncio.wait({primary}, timeout=tracker.threshold())
+        if done:
+            return primary.result()
+
+        hedge = await self.get_hedge_request(file_id, media_session, request)
+        if hedge is None:
+            return await primary
+        if not hedge_budget.try_acquire():
+            hedge.close()
+            hedge_stats["budget_exhausted"] += 1
+            return await primary
+
+        hedge_stats["hedged"] += 1
+        secondary = asyncio.create_task(hedge)
+        pending = {primary, secondary}
+        hedge_won = False
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is secondary:
+                            hedge_stats["hedge_won"] += 1
+                            hedge_won = True
+                        return task.result()
+            return await primary
+        finally:
+            if hedge_won and primary in pending:
+                # A cancelled primary has no latency of its own; the time so far is a lower bound
+                # that still lets the p95 climb above the threshold.
+                tracker.record(monotonic() - started)
+            for task in pending:
+                task.cancel()
+
+    async def send_tracked(self, media_session: Session, request):
+        self.session_loads[media_session] = self.session_loads.get(media_session, 0) + 1
+        try:
+            return await media_session.send(request)
+        finally:
+            self.session_loads[media_session] -= 1
+
+    def least_loaded_session(self, dc_id: int, exclude: Optional[Session] = None) -> Optional[Session]:
+        pool = [session for session in self.session_pools.get(dc_id, []) if session is not exclude]
+        return min(pool, key=lambda session: self.session_loads.get(session, 0)) if pool else None
+
+    async def get_hedge_request(self, file_id: FileId, media_session: Session, request):
+        # A sibling session of our own pool is tried first, then peers that already hold a
+        # FileId and a live session for the DC, so a hedge never costs a get_messages or an auth export.
+        sibling = self.least_loaded_session(file_id.dc_id, exclude=media_session)
+        if sibling:
+            return self.send_tracked(sibling, request)
+
+        for peer in ByteStreamer.instances:
+            if peer is self:
+                continue
+            peer_file_id = peer.get_cached_file_id(file_id.message_chat_id, file_id.message_id)
+            peer_session = peer.least_loaded_session(file_id.dc_id)
+            if peer_file_id and peer_session:
+                location = await peer.get_location(peer_file_id)
+                return peer.send_tracked(peer_session, raw.functions.upload.GetFile(
+                    location=location, offset=request.offset, limit=request.limit
+                ))
+        return None
+
+    async def generate_media_session(self, client: Client, file_id: FileId) -> Session:
+        dc_id = file_id.dc_id
+        pool = self.session_pools.setdefault(dc_id, [])
+        if not pool and client.media_sessions.get(dc_id):
+            pool.append(client.media_sessions[dc_id])
+
+        least = self.least_loaded_session(dc_id)
+        if least and (self.session_loads.get(least, 0) == 0 or len(pool) >= Telegram.MEDIA_SESSIONS_PER_DC):
+            return least
+
+        async with self.session_locks.setdefault(dc_id, asyncio.Lock()):
+            least = self.least_loaded_session(dc_id)
+            if least and (self.session_loads.get(least, 0) == 0 or len(pool) >= Telegram.MEDIA_SESSIONS_PER_DC):
+                return least
+
+            # Extra sessions reuse the pool's already-authorized key, so only the first one needs an auth export.
+            media_session = await self.create_media_session(client, dc_id, pool[0].auth_key if pool else None)
+            if media_session is None:
+                return least
+            pool.append(media_session)
+            client.media_sessions.setdefault(dc_id, media_session)
+            LOGGER.debug(f"Media session pool for DC {dc_id} now has {len(pool)} session(s)")
+            return media_session
+
+    async def create_media_session(self, client: Client, dc_id: int, auth_key: Optional[bytes] = None) -> Optional[Session]:
+        if auth_key is not None:
+            media_session = MediaSession(
+                client,
+                dc_id,
+                auth_key,
+                await client.storage.test_mode(),
+                is_media=True,
+            )
+            await media_session.start()
+        elif dc_id != await client.storage.dc_id():
+            media_session = MediaSession(
+                client,
+                dc_id,
+                await Auth(client, dc_id, await client.storage.test_mode()).create(),
+                await client.storage.test_mode(),
+                is_media=True,
+            )
+            await media_session.start()
+            for _ in range(6):
+                exported_auth = await client.invoke(raw.functions.auth.ExportAuthorization(dc_id=dc_id))
+                try:
+                    
+                    await media_session.send(raw.functions.auth.ImportAuthorization(id=exported_auth.id, bytes=exported_auth.bytes))
+                    break
+                except AuthBytesInvalid:
+                    LOGGER.debug(f"Invalid authorization bytes for DC {dc_id}, retrying...")
+                except OSError:
+                    LOGGER.debug(f"Connection error, retrying...")
+                    await asyncio.sleep(2)
             else:
-                media_session = Session(
-                    client,
-                    file_id.dc_id,
-                    await client.storage.auth_key(),
-                    await client.storage.test_mode(),
-                    is_media=True,
-                )
-                await media_session.start()
-            LOGGER.debug(f"Created media session for DC {file_id.dc_id}")
-            client.media_sessions[file_id.dc_id] = media_session
+                await media_session.stop()
+                LOGGER.debug(f"Failed to establish media session for DC {dc_id} after multiple retries")
+                return None 
         else:
-            LOGGER.debug(f"Using cached media session for DC {file_id.dc_id}")
+            media_session = MediaSession(
+                client,
+                dc_id,
+                await client.storage.auth_key(),
+                await client.storage.test_mode(),
+                is_media=True,
+            )
+            await media_session.start()
+        LOGGER.debug(f"Created media session for DC {dc_id}")
         return media_session
 
 
@@ -1,19 +1,193 @@
-from asyncio import create_task
-from bson import ObjectId
+from asyncio import TimeoutError as AsyncTimeoutError, create_task, gather, wait_for
+from collections import deque
+import heapq
+import json
+from time import monotonic
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from bson import ObjectId, json_util
+from collections import OrderedDict
 import motor.motor_asyncio
 from datetime import datetime
 from pydantic import ValidationError
-from pymongo import ASCENDING, DESCENDING
-from typing import Dict, List, Optional, Tuple, Any
+from pymongo import ASCENDING, DESCENDING, DeleteMany, IndexModel, ReplaceOne, UpdateMany, UpdateOne
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple, Any
 
 from Backend.logger import LOGGER
 from Backend.config import Telegram
 import re
 from Backend.helper.encrypt import decode_string, encode_string
 from Backend.helper.modal import Episode, MovieSchema, QualityDetail, Season, TVShowSchema
+from Backend.helper.search_index import search_index
 from Backend.helper.task_manager import delete_message
 
 
+# Catalog totals per (collection, filter) are reused for this long unless a write invalidates them first.
+COUNT_CACHE_TTL = 300
+# Guarded slot writes retry this often when a concurrent upload changes the slot underneath them.
+SLOT_WRITE_ATTEMPTS = 3
+# Enough of an existing title to update it in place; the full document is only read to move it.
+EXISTING_PROJECTION = {"_id": 1, "tmdb_id": 1}
+# Keyset cursors remembered for Stremio's skip= offsets, so deep catalog scrolls resume instead of skipping.
+MAX_PAGE_CURSORS = 2000
+
+
+# Indexes backing the hot queries on every storage DB: detail lookups by tmdb_id, the
+# title/year probe on insert, quality-id lookups from /dl and scans, and catalog sorts
+# (which always break ties on _id so the cross-shard merge sees one total order).
+STORAGE_INDEXES = {
+    "movie": [
+        IndexModel([("tmdb_id", ASCENDING)], name="tmdb_id"),
+        IndexModel([("title", ASCENDING), ("release_year", ASCENDING)], name="title_year"),
+        IndexModel([("telegram.id", ASCENDING)], name="telegram_id"),
+        IndexModel([("updated_on", DESCENDING), ("_id", DESCENDING)], name="updated_on_id"),
+        IndexModel([("rating", DESCENDING), ("_id", DESCENDING)], name="rating_id"),
+        IndexModel([("genres", ASCENDING), ("updated_on", DESCENDING), ("_id", DESCENDING)], name="genres_updated_on_id"),
+        IndexModel([("genres", ASCENDING), ("rating", DESCENDING), ("_id", DESCENDING)], name="genres_rating_id"),
+    ],
+    "tv": [
+        IndexModel([("tmdb_id", ASCENDING)], name="tmdb_id"),
+        IndexModel([("title", ASCENDING), ("release_year", ASCENDING)], name="title_year"),
+        IndexModel([("seasons.episodes.telegram.id", ASCENDING)], name="telegram_id"),
+        IndexModel([("updated_on", DESCENDING), ("_id", DESCENDING)], name="updated_on_id"),
+        IndexModel([("rating", DESCENDING), ("_id", DESCENDING)], name="rating_id"),
+        IndexModel([("genres", ASCENDING), ("updated_on", DESCENDING), ("_id", DESCENDING)], name="genres_updated_on_id"),
+        IndexModel([("genres", ASCENDING), ("rating", DESCENDING), ("_id", DESCENDING)], name="genres_rating_id"),
+    ],
+}
+
+
+FILE_REGISTRY_INDEXES = [
+    IndexModel([("chat_id", ASCENDING), ("msg_id", ASCENDING)], name="chat_msg", unique=True),
+    IndexModel(
+        [("media_type", ASCENDING), ("tmdb_id", ASCENDING), ("season_number", ASCENDING), ("episode_number", ASCENDING)],
+        name="media_slot"
+    ),
+]
+
+
+INDEX_PROJECTIONS = {
+    "movie": {"tmdb_id": 1, "title": 1, "rating": 1, "telegram.name": 1},
+    "tv": {"tmdb_id": 1, "title": 1, "rating": 1, "seasons.episodes.telegram.name": 1},
+}
+
+SEARCH_PROJECTIONS = {
+    "movie": {
+        "_id": 1, "tmdb_id": 1, "title": 1, "genres": 1, "rating": 1,
+        "release_year": 1, "poster": 1, "backdrop": 1, "description": 1,
+        "media_type": 1, "db_index": 1, "imdb_id": 1, "logo": 1
+    },
+    "tv": {
+        "_id": 1, "tmdb_id": 1, "title": 1, "genres": 1, "rating": 1, "imdb_id": 1,
+        "release_year": 1, "poster": 1, "backdrop": 1, "description": 1, "logo": 1,
+        "media_type": 1, "db_index": 1
+    },
+}
+
+
+def sort_value(value: Any) -> Tuple[int, Any]:
+    # Orders mixed values the way MongoDB sorts BSON types, so merged pages match per-shard order.
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (5, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, ObjectId):
+        return (4, value)
+    if isinstance(value, datetime):
+        return (6, value)
+    return (3, str(value))
+
+
+class MergeKey:
+    __slots__ = ("key", "descending")
+
+    def __init__(self, doc: dict, sort_field: str, descending: bool):
+        self.key = (sort_value(doc.get(sort_field)), doc["_id"])
+        self.descending = descending
+
+    def __lt__(self, other: "MergeKey") -> bool:
+        return other.key < self.key if self.descending else self.key < other.key
+
+
+async def merge_shard_cursors(
+    cursors: Dict[int, Any], sort_field: str, descending: bool, skip: int, limit: int
+) -> List[Tuple[int, dict]]:
+    """
+    k-way merges cursors already sorted on (sort_field, _id) and returns (db_index, doc) pairs
+    for the window [skip, skip + limit) of the combined order. Each shard is read in growing
+    windows, so a shard only pays for the documents that actually reach the merged page.
+    """
+    window = max(limit, 16)
+    windows = {db_index: window for db_index in cursors}
+    first = await gather(
+        *(wait_for(cursor.to_list(length=window), Telegram.SHARD_TIMEOUT) for cursor in cursors.values()),
+        return_exceptions=True
+    )
+    buffers = {}
+    for db_index, docs in zip(cursors, first):
+        if isinstance(docs, BaseException):
+            LOGGER.warning(f"Shard {db_index} left out of merged page: {docs or 'timed out'}")
+            docs = []
+        buffers[db_index] = deque(docs)
+
+    heap = []
+    for db_index, buffer in buffers.items():
+        if buffer:
+            heap.append((MergeKey(buffer[0], sort_field, descending), db_index))
+    heapq.heapify(heap)
+
+    results = []
+    position = 0
+    while heap and len(results) < limit:
+        _, db_index = heapq.heappop(heap)
+        buffer = buffers[db_index]
+        doc = buffer.popleft()
+        if position >= skip:
+            results.append((db_index, doc))
+        position += 1
+
+        if not buffer:
+            windows[db_index] *= 2
+            try:
+                buffer.extend(await wait_for(cursors[db_index].to_list(length=windows[db_index]), Telegram.SHARD_TIMEOUT))
+            except Exception as e:
+                LOGGER.warning(f"Shard {db_index} dropped from merged page: {e or 'timed out'}")
+        if buffer:
+            heapq.heappush(heap, (MergeKey(buffer[0], sort_field, descending), db_index))
+    return results
+
+
+def encode_cursor(sort_field: str, direction: int, doc: dict) -> str:
+    payload = json_util.dumps({"f": sort_field, "d": direction, "v": doc.get(sort_field), "id": doc["_id"]})
+    return urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_field: str, direction: int) -> Tuple[Any, ObjectId]:
+    try:
+        payload = json_util.loads(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        value, last_id = payload["v"], payload["id"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if payload.get("f") != sort_field or payload.get("d") != direction:
+        raise ValueError("Cursor does not match the requested sort order")
+    return value, last_id
+
+
+def keyset_filter(sort_field: str, direction: int, value: Any, last_id: ObjectId) -> dict:
+    # Documents strictly after (value, last_id) in (sort_field, _id) order; null/missing sorts lowest.
+    after = "$lt" if direction == DESCENDING else "$gt"
+    same_value = {sort_field: value, "_id": {after: last_id}}
+    if value is None:
+        return same_value if direction == DESCENDING else {"$or": [same_value, {sort_field: {"$ne": None}}]}
+    branches = [{sort_field: {after: value}}, same_value]
+    if direction == DESCENDING:
+        branches.append({sort_field: None})
+    return {"$or": branches}
+
+
 def convert_objectid_to_str(document: Dict[str, Any]) -> Dict[str, Any]:
     for key, value in document.items():
         if isinstance(value, ObjectId):
@@ -37,6 +211,15 @@ class Database:
         self.dbs: Dict[str, motor.motor_asyncio.AsyncIOMotorDatabase] = {}
 
         self.current_db_index = 1
+        self.file_registry_ready = False
+        self.count_cache: Dict[Tuple[str, str], Tuple[float, List[int]]] = {}
+        self.page_cursors: "OrderedDict[Tuple[str, str, str, int, int], str]" = OrderedDict()
+        self.directory: Dict[Tuple[str, int], dict] = {}
+        self.directory_titles: Dict[Tuple[str, str, Any], int] = {}
+        self.directory_ready = False
+        # Only a rebuild from the storage DBs proves no title is missing; a loaded copy may lack
+        # titles whose directory write failed or never ran (crash between the two writes).
+        self.directory_complete = False
 
     async def connect(self):
         try:
@@ -61,6 +244,16 @@ class Database:
 
             LOGGER.info(f"Active storage DB: storage_{self.current_db_index}")
 
+            await self.ensure_indexes()
+
+            registry_state = await self.dbs["tracking"]["state"].find_one({"_id": "file_registry"})
+            if not registry_state or not registry_state.get("built"):
+                create_task(self.rebuild_file_registry())
+            else:
+                self.file_registry_ready = True
+            create_task(self.build_search_index())
+            create_task(self.load_shard_directory())
+
         except Exception as e:
             LOGGER.error(f"Database connection error: {e}")
 
@@ -69,6 +262,49 @@ class Database:
             client.close()
         LOGGER.info("All database connections closed.")
 
+    async def ensure_indexes(self):
+        try:
+            await self.dbs["tracking"]["files"].create_indexes(FILE_REGISTRY_INDEXES)
+        except Exception as e:
+            LOGGER.error(f"Failed to create file registry indexes: {e}")
+        for db_key, db in self.dbs.items():
+            if not db_key.startswith("storage_"):
+                continue
+            for collection_name, indexes in STORAGE_INDEXES.items():
+                try:
+                    await db[collection_name].create_indexes(indexes)
+                except Exception as e:
+                    LOGGER.error(f"Failed to create {collection_name} indexes on {db_key}: {e}")
+        LOGGER.info("Storage DB indexes ensured.")
+
+    async def get_index_report(self) -> List[dict]:
+        report = []
+        for db_key, db in self.dbs.items():
+            if not db_key.startswith("storage_"):
+                continue
+            for collection_name, indexes in STORAGE_INDEXES.items():
+                collection = db[collection_name]
+                try:
+                    existing = await collection.index_information()
+                    usage = {
+                        stat["name"]: stat["accesses"]["ops"]
+                        for stat in await collection.aggregate([{"$indexStats": {}}]).to_list(None)
+                    }
+                except Exception as e:
+                    report.append({"db_name": db_key, "collection": collection_name, "error": str(e)})
+                    continue
+
+                existing_keys = {tuple(info["key"]): name for name, info in existing.items()}
+                expected_keys = {tuple(index.document["key"].items()): index.document["name"] for index in indexes}
+                report.append({
+                    "db_name": db_key,
+                    "collection": collection_name,
+                    "missing": [name for key, name in expected_keys.items() if key not in existing_keys],
+                    "unused": [name for name in existing if name != "_id_" and usage.get(name, 0) == 0],
+                    "usage": usage,
+                })
+        return report
+
     async def update_current_db_index(self):
         await self.dbs["tracking"]["state"].update_one(
             {"_id": "db_index"},
@@ -86,60 +322,127 @@ class Database:
             return {sort_field: DESCENDING if sort_direction.lower() == "desc" else ASCENDING}
         return {"updated_on": DESCENDING}
 
+    async def _gather_shards(self, calls: Dict[Hashable, Awaitable], partial: bool = True) -> Dict[Hashable, Any]:
+        """
+        Awaits per-shard calls concurrently, each bounded by SHARD_TIMEOUT, so latency follows the
+        slowest shard rather than the sum. With partial=True failed or slow shards are logged and
+        left out of the result; otherwise the first failure is raised.
+        """
+        keys = list(calls)
+        outcomes = await gather(
+            *(wait_for(calls[key], Telegram.SHARD_TIMEOUT) for key in keys), return_exceptions=True
+        )
+        results = {}
+        for key, outcome in zip(keys, outcomes):
+            if isinstance(outcome, BaseException):
+                reason = "timed out" if isinstance(outcome, AsyncTimeoutError) else str(outcome)
+                if not partial:
+                    raise RuntimeError(f"Shard query {key} failed: {reason}") from outcome
+                LOGGER.warning(f"Shard query {key} failed, returning partial results: {reason}")
+                continue
+            results[key] = outcome
+        return results
+
+    async def fan_out(
+        self, func: Callable[[int, Any], Awaitable], db_indexes: Optional[List[int]] = None, partial: bool = True
+    ) -> Dict[int, Any]:
+        db_indexes = db_indexes or list(range(1, len(self.dbs)))
+        return await self._gather_shards(
+            {db_index: func(db_index, self.dbs[f"storage_{db_index}"]) for db_index in db_indexes}, partial=partial
+        )
+
+    async def _find_existing(self, collection_name: str, query: dict) -> Tuple[Optional[int], Optional[dict]]:
+        if self.directory_ready:
+            db_index = self.directory_titles.get((collection_name, query["title"], query["release_year"]))
+            if db_index is not None:
+                document = await self.dbs[f"storage_{db_index}"][collection_name].find_one(query, EXISTING_PROJECTION)
+                if document:
+                    return db_index, document
+                LOGGER.warning(f"Shard directory out of date for {query['title']} ({query['release_year']}), probing all storage DBs")
+            elif self.directory_complete:
+                return None, None
+
+        # Writes must not act on a partial view (a slow shard could hide the existing title), so this is strict.
+        found = await self.fan_out(
+            lambda _, db: db[collection_name].find_one(query, EXISTING_PROJECTION), partial=False
+        )
+        for db_index in sorted(found):
+            if found[db_index]:
+                return db_index, found[db_index]
+        return None, None
+
     async def _paginate_collection(
         self,
         collection_name: str,
         sort_dict: Dict[str, int],
         page: int,
         page_size: int,
-        filter_dict: Optional[dict] = None
+        filter_dict: Optional[dict] = None,
+        cursor: Optional[str] = None
     ):
         filter_dict = filter_dict or {}
         skip = (page - 1) * page_size
-        results = []
-        dbs_checked = []
-        total_count = 0
-
-        db_counts = []
-        for i in range(1, self.current_db_index + 1):
-            db_key = f"storage_{i}"
-            db = self.dbs[db_key]
-            count = await db[collection_name].count_documents(filter_dict)
-            db_counts.append((i, count))
-            total_count += count
-
-        start_db_index = None
-        for db_index, count in reversed(db_counts):
-            if skip < count:
-                start_db_index = db_index
-                break
-            skip -= count
-
-        if not start_db_index:
-            return [], [], total_count
-
-        for db_index, count in reversed(db_counts):
-            if db_index < start_db_index:
-                continue
-
-            db_key = f"storage_{db_index}"
-            db = self.dbs[db_key]
-            dbs_checked.append(db_index)
-
-            cursor = (
-                db[collection_name]
-                .find(filter_dict)
-                .sort(sort_dict)
-                .skip(skip if db_index == start_db_index else 0)
-                .limit(page_size - len(results))
-            )
-
-            docs = await cursor.to_list(None)
-            results.extend(docs)
-
-            if len(results) >= page_size:
-                break
-        return results, dbs_checked, total_count
+        (sort_field, direction), = sort_dict.items()
+        sort = [(sort_field, direction), ("_id", direction)]
+        filter_key = json.dumps(filter_dict, sort_keys=True, default=str)
+
+        db_indexes = list(range(1, len(self.dbs)))
+        counts = await self._shard_counts(collection_name, filter_dict, db_indexes)
+        total_count = sum(counts)
+        if skip >= total_count and not cursor:
+            return [], [], total_count, None
+
+        # Only pages reached by offset have a known position to remember the next cursor under.
+        known_position = not cursor
+        if not cursor and skip:
+            cursor = self.page_cursors.get((collection_name, filter_key, sort_field, direction, skip))
+
+        query = filter_dict
+        if cursor:
+            value, last_id = decode_cursor(cursor, sort_field, direction)
+            keyset = keyset_filter(sort_field, direction, value, last_id)
+            query = {"$and": [filter_dict, keyset]} if filter_dict else keyset
+            skip = 0
+
+        cursors = {
+            db_index: self.dbs[f"storage_{db_index}"][collection_name]
+            .find(query)
+            .sort(sort)
+            .limit(min(count, skip + page_size))
+            for db_index, count in zip(db_indexes, counts) if count
+        }
+        merged = await merge_shard_cursors(cursors, sort_field, direction == DESCENDING, skip, page_size)
+        dbs_checked = sorted({db_index for db_index, _ in merged}, reverse=True)
+        results = [doc for _, doc in merged]
+
+        next_cursor = None
+        if len(results) == page_size:
+            next_cursor = encode_cursor(sort_field, direction, results[-1])
+            if known_position:
+                next_key = (collection_name, filter_key, sort_field, direction, page * page_size)
+                self.page_cursors[next_key] = next_cursor
+                self.page_cursors.move_to_end(next_key)
+                if len(self.page_cursors) > MAX_PAGE_CURSORS:
+                    self.page_cursors.popitem(last=False)
+        return results, dbs_checked, total_count, next_cursor
+
+    async def _shard_counts(self, collection_name: str, filter_dict: dict, db_indexes: List[int]) -> List[int]:
+        key = (collection_name, json.dumps(filter_dict, sort_keys=True, default=str))
+        cached = self.count_cache.get(key)
+        if cached and monotonic() - cached[0] < COUNT_CACHE_TTL and len(cached[1]) == len(db_indexes):
+            return cached[1]
+        found = await self.fan_out(lambda _, db: db[collection_name].count_documents(filter_dict), db_indexes)
+        counts = [found.get(db_index, 0) for db_index in db_indexes]
+        if len(found) == len(db_indexes):
+            self.count_cache[key] = (monotonic(), counts)
+        return counts
+
+    def invalidate_counts(self, collection_name: str):
+        for key in [key for key in self.count_cache if key[0] == collection_name]:
+            del self.count_cache[key]
+        # Offsets shift when documents come and go, so skip-mapped cursors are stale too.
+        for key in [key for key in self.page_cursors if key[0] == collection_name]:
+            del self.page_cursors[key]
 
     async def _move_document(
         self, collection_name: str, document: dict, old_db_index: int
@@ -150,6 +453,11 @@ class Database:
         try:
             await self.dbs[current_db_key][collection_name].insert_one(document)
             await self.dbs[old_db_key][collection_name].delete_one({"_id": document["_id"]})
+            self.invalidate_counts(collection_name)
+            await self.update_directory(
+                collection_name, document.get("tmdb_id"), document.get("title"), document.get("release_year"),
+                self.current_db_index
+            )
             LOGGER.info(f"✅ Moved document {document.get('tmdb_id')} from {old_db_key} to {current_db_key}")
             return True
         except Exception as e:
@@ -173,11 +481,23 @@ class Database:
 
     async def insert_media(
         self, metadata_info: dict,
-        channel: int, msg_id: int, size: str, name: str
+        channel: int, msg_id: int, size: str, name: str,
+        file_info: Optional[dict] = None
     ) -> Optional[ObjectId]:
-        
+        media = self._media_schema(metadata_info, channel, msg_id, size, name, file_info)
+        if isinstance(media, MovieSchema):
+            return await self.update_movie(media)
+        return await self.update_tv_show(media)
+
+    def _media_schema(
+        self, metadata_info: dict,
+        channel: int, msg_id: int, size: str, name: str,
+        file_info: Optional[dict] = None
+    ):
+        file_info = file_info or {}
+
         if metadata_info['media_type'] == "movie":
-            media = MovieSchema(
+            return MovieSchema(
                 tmdb_id=metadata_info['tmdb_id'],
                 imdb_id=metadata_info['imdb_id'],
                 db_index=self.current_db_index,
@@ -194,12 +514,12 @@ class Database:
                     quality=metadata_info['quality'],
                     id=metadata_info['encoded_string'],
                     name=name,
-                    size=size
+                    size=size,
+                    **file_info
                 )]
             )
-            return await self.update_movie(media)
         else:
-            tv_show = TVShowSchema(
+            return TVShowSchema(
                 tmdb_id=metadata_info['tmdb_id'],
                 imdb_id=metadata_info['imdb_id'],
                 db_index=self.current_db_index,
@@ -222,12 +542,12 @@ class Database:
                             quality=metadata_info['quality'],
                             id=metadata_info['encoded_string'],
                             name=name,
-                            size=size
+                            size=size,
+                            **file_info
                         )]
                     )]
                 )]
             )
-            return await self.update_tv_show(tv_show)
 
     async def update_movie(self, movie_data: MovieSchema) -> Optional[ObjectId]:
         try:
@@ -237,36 +557,33 @@ class Database:
             return None
 
         tmdb_id = movie_dict["tmdb_id"]
-        
-
         title = movie_dict["title"]
         release_year = movie_dict["release_year"]
         quality_to_update = movie_dict["telegram"][0]
         target_quality = quality_to_update["quality"]
         current_db_key = f"storage_{self.current_db_index}"
+        total_storage_dbs = len(self.dbs) - 1
+        title_filter = {"title": title, "release_year": release_year}
 
-        total_storage_dbs = len(self.dbs) - 1  
-        existing_db_key = None
-        existing_db_index = None
-        existing_movie = None
-
-        
-        for db_index in range(1, total_storage_dbs + 1):
-            db_key = f"storage_{db_index}"
-            movie = await self.dbs[db_key]["movie"].find_one(
-                    {"title": title, "release_year": release_year}
-            )
-            if movie:
-                existing_db_key = db_key
-                existing_db_index = db_index
-                existing_movie = movie
-                break
+        try:
+            existing_db_index, existing_movie = await self._find_existing("movie", title_filter)
+        except Exception as e:
+            LOGGER.error(f"Could not check storage DBs for existing {title} ({release_year}): {e}")
+            return None
 
         if not existing_movie:
             try:
                 movie_dict["db_index"] = self.current_db_index
-                result = await self.dbs[current_db_key]["movie"].insert_one(movie_dict)
-                return result.inserted_id
+                result = await self.dbs[current_db_key]["movie"].update_one(
+                    title_filter, {"$setOnInsert": movie_dict}, upsert=True
+                )
+                if result.upserted_id is not None:
+                    self.invalidate_counts("movie")
+                    await self.register_files("movie", movie_dict, self.current_db_index)
+                    return result.upserted_id
+                # Another upload created the title in the meantime; add to it below.
+                existing_db_index = self.current_db_index
+                existing_movie = await self.dbs[current_db_key]["movie"].find_one(title_filter, EXISTING_PROJECTION)
             except Exception as e:
                 LOGGER.error(f"Insertion failed in {current_db_key}: {e}")
                 if any(keyword in str(e).lower() for keyword in ["storage", "quota"]):
@@ -274,37 +591,36 @@ class Database:
                 return None
 
         movie_id = existing_movie["_id"]
-        existing_qualities = existing_movie.get("telegram", [])
-        matching_quality = next((q for q in existing_qualities if q["quality"] == target_quality), None)
-        if matching_quality:
-            
-            try:
-                old_id = matching_quality.get("id")
-                if old_id:
-                    decoded_data = await decode_string(old_id)
-                    chat_id = int(f"-100{decoded_data['chat_id']}")
-                    msg_id = int(decoded_data['msg_id'])
-                    create_task(delete_message(chat_id, msg_id))
-            except Exception as e:
-                LOGGER.error(f"Failed to queue old quality file for deletion: {e}")
-
-            matching_quality.update(quality_to_update)
-        else:
-            existing_qualities.append(quality_to_update)
-        existing_movie["telegram"] = existing_qualities
-        existing_movie["updated_on"] = datetime.utcnow()
-
+        registry_dict = {**movie_dict, "tmdb_id": existing_movie.get("tmdb_id", tmdb_id)}
         if existing_db_index != self.current_db_index:
-            try:
-                if await self._move_document("movie", existing_movie, existing_db_index):
-                    return movie_id
-            except Exception as e:
-                LOGGER.error(f"Error moving movie to {current_db_key}: {e}")
-                if any(keyword in str(e).lower() for keyword in ["storage", "quota"]):
-                    return await self._handle_storage_error(self.update_movie, movie_data, total_storage_dbs=total_storage_dbs)
+            existing_db_index = await self._consolidate_document("movie", movie_id, existing_db_index)
+        existing_db_key = f"storage_{existing_db_index}"
+        collection = self.dbs[existing_db_key]["movie"]
 
         try:
-            await self.dbs[existing_db_key]["movie"].replace_one({"_id": movie_id}, existing_movie)
+            replaced = []
+            for _ in range(SLOT_WRITE_ATTEMPTS):
+                old_ids = await self._quality_ids(collection, {"_id": movie_id}, quality=target_quality)
+                if old_ids:
+                    result = await collection.update_one(
+                        {"_id": movie_id, "telegram": {"$elemMatch": {"quality": target_quality, "id": old_ids[0]}}},
+                        {"$set": {"telegram.$": quality_to_update, "updated_on": datetime.utcnow()}}
+                    )
+                else:
+                    result = await collection.update_one(
+                        {"_id": movie_id, "telegram.quality": {"$ne": target_quality}},
+                        {"$push": {"telegram": quality_to_update}, "$set": {"updated_on": datetime.utcnow()}}
+                    )
+                if result.matched_count:
+                    replaced = [old_id for old_id in old_ids if old_id != quality_to_update["id"]]
+                    self._queue_message_deletion(replaced)
+                    break
+            else:
+                LOGGER.error(f"Gave up updating {target_quality} of movie {tmdb_id}: slot kept changing")
+                return None
+            await self.register_files("movie", registry_dict, existing_db_index)
+            if replaced:
+                await self.reindex_document("movie", registry_dict["tmdb_id"], existing_db_index)
             return movie_id
         except Exception as e:
             LOGGER.error(f"Failed to update movie {tmdb_id} in {existing_db_key}: {e}")
@@ -319,33 +635,31 @@ class Database:
             return None
 
         tmdb_id = tv_show_dict["tmdb_id"]
-        
-
         title = tv_show_dict["title"]
         release_year = tv_show_dict["release_year"]
         current_db_key = f"storage_{self.current_db_index}"
         total_storage_dbs = len(self.dbs) - 1
+        title_filter = {"title": title, "release_year": release_year}
 
-        existing_db_key = None
-        existing_db_index = None
-        existing_tv = None
-
-        for db_index in range(1, total_storage_dbs + 1):
-            db_key = f"storage_{db_index}"
-            tv = await self.dbs[db_key]["tv"].find_one(
-                    {"title": title, "release_year": release_year}
-            )
-            if tv:
-                existing_db_key = db_key
-                existing_db_index = db_index
-                existing_tv = tv
-                break
+        try:
+            existing_db_index, existing_tv = await self._find_existing("tv", title_filter)
+        except Exception as e:
+            LOGGER.error(f"Could not check storage DBs for existing {title} ({release_year}): {e}")
+            return None
 
         if not existing_tv:
             try:
                 tv_show_dict["db_index"] = self.current_db_index
-                result = await self.dbs[current_db_key]["tv"].insert_one(tv_show_dict)
-                return result.inserted_id
+                result = await self.dbs[current_db_key]["tv"].update_one(
+                    title_filter, {"$setOnInsert": tv_show_dict}, upsert=True
+                )
+                if result.upserted_id is not None:
+                    self.invalidate_counts("tv")
+                    await self.register_files("tv", tv_show_dict, self.current_db_index)
+                    return result.upserted_id
+                # Another upload created the show in the meantime; add to it below.
+                existing_db_index = self.current_db_index
+                existing_tv = await self.dbs[current_db_key]["tv"].find_one(title_filter, EXISTING_PROJECTION)
             except Exception as e:
                 LOGGER.error(f"Insertion failed in {current_db_key}: {e}")
                 if any(keyword in str(e).lower() for keyword in ["storage", "quota"]):
@@ -353,68 +667,441 @@ class Database:
                 return None
 
         tv_id = existing_tv["_id"]
-        for season in tv_show_dict["seasons"]:
-            existing_season = next(
-                (s for s in existing_tv["seasons"] if s["season_number"] == season["season_number"]), None
-            )
-            if existing_season:
-                for episode in season["episodes"]:
-                    existing_episode = next(
-                        (e for e in existing_season["episodes"] if e["episode_number"] == episode["episode_number"]), None
-                    )
-                    if existing_episode:
-                        existing_episode.setdefault("telegram", [])
-                        for quality in episode["telegram"]:
-                            existing_quality = next(
-                                (q for q in existing_episode["telegram"]
-                                if q.get("quality") == quality.get("quality")),
-                                None
-                            )
-                            if existing_quality:
-                                try:
-                                    old_id = existing_quality.get("id")
-
-                                    if old_id:
-                                        decoded_data = await decode_string(old_id)
-
-                                        chat_id = int(f"-100{decoded_data['chat_id']}")
-                                        msg_id = int(decoded_data['msg_id'])
-                                        create_task(delete_message(chat_id, msg_id))
-                                        
-                                except Exception as e:
-                                    LOGGER.error(f"Failed to queue old quality file for deletion: {e}")
-                                existing_quality.update(quality)
-                            else:
-                                existing_episode["telegram"].append(quality)
-                    else:
-                        existing_season["episodes"].append(episode)
-            else:
-                existing_tv["seasons"].append(season)
-        existing_tv["updated_on"] = datetime.utcnow()
-
+        registry_dict = {**tv_show_dict, "tmdb_id": existing_tv.get("tmdb_id", tmdb_id)}
         if existing_db_index != self.current_db_index:
-            try:
-                if await self._move_document("tv", existing_tv, existing_db_index):
-                    return tv_id
-            except Exception as e:
-                LOGGER.error(f"Error moving TV show to {current_db_key}: {e}")
-                if any(keyword in str(e).lower() for keyword in ["storage", "quota"]):
-                    return await self._handle_storage_error(self.update_tv_show, tv_show_data, total_storage_dbs=total_storage_dbs)
-            return tv_id
+            existing_db_index = await self._consolidate_document("tv", tv_id, existing_db_index)
+        existing_db_key = f"storage_{existing_db_index}"
+        collection = self.dbs[existing_db_key]["tv"]
 
         try:
-            await self.dbs[existing_db_key]["tv"].replace_one({"_id": tv_id}, existing_tv)
+            replaced = []
+            for season in tv_show_dict["seasons"]:
+                for episode in season["episodes"]:
+                    for quality in episode.get("telegram") or []:
+                        written = await self._write_episode_quality(collection, tv_id, season, episode, quality)
+                        if written is None:
+                            LOGGER.error(
+                                f"Gave up updating S{season['season_number']}E{episode['episode_number']} "
+                                f"{quality.get('quality')} of TV show {tmdb_id}: slot kept changing"
+                            )
+                            return None
+                        replaced.extend(written)
+            await self.register_files("tv", registry_dict, existing_db_index)
+            if replaced:
+                await self.reindex_document("tv", registry_dict["tmdb_id"], existing_db_index)
             return tv_id
         except Exception as e:
             LOGGER.error(f"Failed to update TV show {tmdb_id} in {existing_db_key}: {e}")
             if any(keyword in str(e).lower() for keyword in ["storage", "quota"]):
                 return await self._handle_storage_error(self.update_tv_show, tv_show_data, total_storage_dbs=total_storage_dbs)
+
+    async def _write_episode_quality(
+        self, collection, tv_id: ObjectId, season: dict, episode: dict, quality: dict
+    ) -> Optional[List[str]]:
+        """
+        Puts one quality into its season/episode slot with a single guarded update: replace the
+        quality in place, else push it into the episode, else push the episode into the season,
+        else push the season. Each filter only matches when its level is the one missing, so
+        concurrent writers to the same show never clobber each other; a lost race just retries.
+        Returns the ids of the files it replaced, or None if it kept losing.
+        """
+        season_number = season["season_number"]
+        episode_number = episode["episode_number"]
+        target_quality = quality.get("quality")
+        array_filters = [{"s.season_number": season_number}, {"e.episode_number": episode_number}]
+        new_episode = {**episode, "telegram": [quality]}
+
+        for _ in range(SLOT_WRITE_ATTEMPTS):
+            updated_on = {"updated_on": datetime.utcnow()}
+            old_ids = await self._quality_ids(
+                collection, {"_id": tv_id}, season_number, episode_number, target_quality
+            )
+            if old_ids:
+                result = await collection.update_one(
+                    {"_id": tv_id, "seasons": {"$elemMatch": {"season_number": season_number, "episodes": {"$elemMatch": {
+                        "episode_number": episode_number,
+                        "telegram": {"$elemMatch": {"quality": target_quality, "id": old_ids[0]}}
+                    }}}}},
+                    {"$set": {"seasons.$[s].episodes.$[e].telegram.$[q]": quality, **updated_on}},
+                    array_filters=array_filters + [{"q.quality": target_quality, "q.id": old_ids[0]}]
+                )
+                if result.matched_count:
+                    replaced = [old_id for old_id in old_ids if old_id != quality.get("id")]
+                    self._queue_message_deletion(replaced)
+                    return replaced
+                continue
+
+            attempts = (
+                (
+                    {"seasons": {"$elemMatch": {"season_number": season_number, "episodes": {"$elemMatch": {
+                        "episode_number": episode_number, "telegram.quality": {"$ne": target_quality}
+                    }}}}},
+                    {"$push": {"seasons.$[s].episodes.$[e].telegram": quality}},
+                    array_filters,
+                ),
+                (
+                    {"seasons": {"$elemMatch": {
+                        "season_number": season_number, "episodes.episode_number": {"$ne": episode_number}
+                    }}},
+                    {"$push": {"seasons.$[s].episodes": new_episode}},
+                    array_filters[:1],
+                ),
+                (
+                    {"seasons.season_number": {"$ne": season_number}},
+                    {"$push": {"seasons": {**season, "episodes": [new_episode]}}},
+                    None,
+                ),
+            )
+            for filter_dict, update, filters in attempts:
+                result = await collection.update_one(
+                    {"_id": tv_id, **filter_dict}, {**update, "$set": updated_on}, array_filters=filters
+                )
+                if result.matched_count:
+                    return []
+        return None
+
+    async def _quality_ids(
+        self,
+        collection,
+        match: dict,
+        season_number: Optional[int] = None,
+        episode_number: Optional[int] = None,
+        quality: Optional[str] = None
+    ) -> List[str]:
+        # Reads just the file ids under a slot server-side instead of pulling the whole document.
+        pipeline = [{"$match": match}]
+        if collection.name == "movie":
+            pipeline += [{"$unwind": "$telegram"}, {"$replaceRoot": {"newRoot": "$telegram"}}]
+        else:
+            pipeline.append({"$unwind": "$seasons"})
+            if season_number is not None:
+                pipeline.append({"$match": {"seasons.season_number": season_number}})
+            pipeline.append({"$unwind": "$seasons.episodes"})
+            if episode_number is not None:
+                pipeline.append({"$match": {"seasons.episodes.episode_number": episode_number}})
+            pipeline += [
+                {"$unwind": "$seasons.episodes.telegram"},
+                {"$replaceRoot": {"newRoot": "$seasons.episodes.telegram"}},
+            ]
+        if quality is not None:
+            pipeline.append({"$match": {"quality": quality}})
+        pipeline.append({"$project": {"_id": 0, "id": 1}})
+        return [doc["id"] for doc in await collection.aggregate(pipeline).to_list(None) if doc.get("id")]
+
+    def _queue_message_deletion(self, quality_ids):
+        for quality_id in quality_ids:
+            create_task(self._delete_quality_message(quality_id))
+
+    async def _delete_quality_message(self, quality_id: str):
+        try:
+            decoded_data = await decode_string(quality_id)
+            chat_id = int(f"-100{decoded_data['chat_id']}")
+            msg_id = int(decoded_data['msg_id'])
+            await delete_message(chat_id, msg_id)
+        except Exception as e:
+            LOGGER.error(f"Failed to queue file for deletion: {e}")
+
+    async def _consolidate_document(self, collection_name: str, document_id: ObjectId, db_index: int) -> int:
+        # Titles touched on an older shard move to the active one; the write then lands there.
+        document = await self.dbs[f"storage_{db_index}"][collection_name].find_one({"_id": document_id})
+        if document and await self._move_document(collection_name, document, db_index):
+            return self.current_db_index
+        return db_index
     
-    async def sort_movies(self, sort_params, page, page_size, genre_filter=None):
+    # -------------------------------
+    # Batched Ingest
+    # -------------------------------
+
+    async def insert_media_batch(self, items: List[dict]) -> List[Optional[ObjectId]]:
+        """
+        Applies a batch of insert_media calls (their keyword arguments) with as few round trips as
+        possible: files are grouped by target title, each title's changes become at most four
+        non-overlapping guarded updates, and those run as one unordered bulk_write per shard and
+        collection. Anything a guard rejects (a concurrent writer got there first) is re-applied
+        one file at a time through insert_media.
+        """
+        results: List[Optional[ObjectId]] = [None] * len(items)
+        groups: Dict[Tuple[str, str, Any], List[Tuple[int, dict]]] = {}
+        for position, item in enumerate(items):
+            try:
+                media_dict = self._media_schema(**item).dict()
+            except (ValidationError, KeyError) as e:
+                LOGGER.error(f"Validation error: {e}")
+                continue
+            collection_name = "movie" if media_dict["media_type"] == "movie" else "tv"
+            groups.setdefault((collection_name, media_dict["title"], media_dict["release_year"]), []).append(
+                (position, media_dict)
+            )
+
+        located = await gather(*(
+            self._find_existing(collection_name, {"title": title, "release_year": release_year})
+            for collection_name, title, release_year in groups
+        ), return_exceptions=True)
+
+        retry: List[int] = []
+        bulks: Dict[Tuple[int, str], List[dict]] = {}
+        for (collection_name, _, _), entries, location in zip(groups, groups.values(), located):
+            if isinstance(location, BaseException):
+                LOGGER.error(f"Could not place {len(entries)} batched files: {location}")
+                retry.extend(position for position, _ in entries)
+                continue
+            plan = await self._plan_document_write(collection_name, entries, *location)
+            if plan is None:
+                retry.extend(position for position, _ in entries)
+                continue
+            bulks.setdefault((plan["db_index"], collection_name), []).append(plan)
+
+        outcomes = await gather(*(
+            self._run_bulk(db_index, collection_name, plans) for (db_index, collection_name), plans in bulks.items()
+        ))
+        registrations: List[Tuple[str, dict, int]] = []
+        reindex: List[bool] = []
+        for (db_index, collection_name), plans, failed in zip(bulks, bulks.values(), outcomes):
+            failed_plans = {id(plan) for plan in failed}
+            for plan in plans:
+                if id(plan) in failed_plans:
+                    retry.extend(position for position, _ in plan["entries"])
+                    continue
+                self._queue_message_deletion(plan["replaced"])
+                registrations.append((collection_name, plan["registry_dict"], db_index))
+                reindex.append(bool(plan["replaced"]))
+                for position, _ in plan["entries"]:
+                    results[position] = plan["doc_id"]
+            if any(plan["upsert"] for plan in plans):
+                self.invalidate_counts(collection_name)
+        if registrations:
+            # The whole batch's registry changes go to the tracking DB in one ordered bulk_write.
+            await self.register_files_batch(registrations)
+        for (collection_name, registry_dict, db_index), replaced in zip(registrations, reindex):
+            if replaced:
+                await self.reindex_document(collection_name, registry_dict["tmdb_id"], db_index)
+
+        for position in sorted(retry):
+            results[position] = await self.insert_media(**items[position])
+        return results
+
+    async def _plan_document_write(
+        self, collection_name: str, entries: List[Tuple[int, dict]], db_index: Optional[int], existing: Optional[dict]
+    ) -> Optional[dict]:
+        merged = self._merge_entries(collection_name, entries)
+        if not existing:
+            document = {**entries[0][1], **merged["document"], "db_index": self.current_db_index}
+            return {
+                "db_index": self.current_db_index,
+                "doc_id": None,
+                "upsert": True,
+                "entries": entries,
+                "replaced": merged["replaced"],
+                "registry_dict": document,
+                "ops": [UpdateOne(
+                    {"title": document["title"], "release_year": document["release_year"]},
+                    {"$setOnInsert": document},
+                    upsert=True
+                )],
+            }
+
+        doc_id = existing["_id"]
+        if db_index != self.current_db_index:
+            db_index = await self._consolidate_document(collection_name, doc_id, db_index)
+        projection = (
+            {"telegram.quality": 1, "telegram.id": 1} if collection_name == "movie"
+            else {"seasons.season_number": 1, "seasons.episodes.episode_number": 1,
+                  "seasons.episodes.telegram.quality": 1, "seasons.episodes.telegram.id": 1}
+        )
+        skeleton = await self.dbs[f"storage_{db_index}"][collection_name].find_one({"_id": doc_id}, projection)
+        if not skeleton:
+            return None
+
+        if collection_name == "movie":
+            slots = {q.get("quality"): q.get("id") for q in skeleton.get("telegram") or []}
+            ops, replaced = self._movie_slot_ops(doc_id, slots, merged["document"]["telegram"])
+        else:
+            slots = {
+                season.get("season_number"): {
+                    episode.get("episode_number"): {q.get("quality"): q.get("id") for q in episode.get("telegram") or []}
+                    for episode in season.get("episodes") or []
+                }
+                for season in skeleton.get("seasons") or []
+            }
+            ops, replaced = self._tv_slot_ops(doc_id, slots, merged["document"]["seasons"])
+        return {
+            "db_index": db_index,
+            "doc_id": doc_id,
+            "upsert": False,
+            "entries": entries,
+            "replaced": merged["replaced"] + replaced,
+            "registry_dict": {**entries[0][1], **merged["document"], "tmdb_id": existing.get("tmdb_id", entries[0][1]["tmdb_id"])},
+            "ops": ops,
+        }
+
+    @staticmethod
+    def _merge_entries(collection_name: str, entries: List[Tuple[int, dict]]) -> dict:
+        # Folds a title's batched files into one document, later files winning a quality slot the
+        # way sequential uploads would; the files they displace are returned for deletion.
+        replaced = []
+
+        def put_quality(qualities: List[dict], quality: dict):
+            for index, existing in enumerate(qualities):
+                if existing.get("quality") == quality.get("quality"):
+                    if existing.get("id") != quality.get("id"):
+                        replaced.append(existing.get("id"))
+                    qualities[index] = quality
+                    return
+            qualities.append(quality)
+
+        if collection_name == "movie":
+            qualities = []
+            for _, media_dict in entries:
+                for quality in media_dict["telegram"]:
+                    put_quality(qualities, quality)
+            return {"document": {"telegram": qualities}, "replaced": [i for i in replaced if i]}
+
+        seasons: Dict[int, dict] = {}
+        for _, media_dict in entries:
+            for season in media_dict["seasons"]:
+                target_season = seasons.setdefault(season["season_number"], {**season, "episodes": []})
+                for episode in season["episodes"]:
+                    target_episode = next(
+                        (e for e in target_season["episodes"] if e["episode_number"] == episode["episode_number"]), None
+                    )
+                    if target_episode is None:
+                        target_episode = {**episode, "telegram": []}
+                        target_season["episodes"].append(target_episode)
+                    for quality in episode.get("telegram") or []:
+                        put_quality(target_episode["telegram"], quality)
+        return {"document": {"seasons": list(seasons.values())}, "replaced": [i for i in replaced if i]}
+
+    @staticmethod
+    def _movie_slot_ops(doc_id: ObjectId, slots: Dict[str, str], qualities: List[dict]) -> Tuple[List[UpdateOne], List[str]]:
+        updated_on = {"updated_on": datetime.utcnow()}
+        ops, replaced = [], []
+        new_qualities = [q for q in qualities if q.get("quality") not in slots]
+        if new_qualities:
+            ops.append(UpdateOne(
+                {"_id": doc_id, "telegram.quality": {"$nin": [q.get("quality") for q in new_qualities]}},
+                {"$push": {"telegram": {"$each": new_qualities}}, "$set": updated_on}
+            ))
+        changes = [q for q in qualities if q.get("quality") in slots]
+        if changes:
+            updates, array_filters, guards = dict(updated_on), [], []
+            for i, quality in enumerate(changes):
+                old_id = slots[quality.get("quality")]
+                updates[f"telegram.$[q{i}]"] = quality
+                array_filters.append({f"q{i}.quality": quality.get("quality"), f"q{i}.id": old_id})
+                guards.append({"telegram": {"$elemMatch": {"quality": quality.get("quality"), "id": old_id}}})
+                if old_id and old_id != quality.get("id"):
+                    replaced.append(old_id)
+            ops.append(UpdateOne({"_id": doc_id, "$and": guards}, {"$set": updates}, array_filters=array_filters))
+        return ops, replaced
+
+    @staticmethod
+    def _tv_slot_ops(doc_id: ObjectId, slots: Dict[int, dict], seasons: List[dict]) -> Tuple[List[UpdateOne], List[str]]:
+        # At most one update per tree level; none of them touch overlapping paths, so an unordered
+        # bulk may run them in any order.
+        updated_on = {"updated_on": datetime.utcnow()}
+        new_seasons, new_episodes, new_qualities, changes, replaced = [], {}, {}, [], []
+        for season in seasons:
+            season_number = season["season_number"]
+            if season_number not in slots:
+                new_seasons.append(season)
+                continue
+            for episode in season["episodes"]:
+                episode_number = episode["episode_number"]
+                existing_episode = slots[season_number].get(episode_number)
+                if existing_episode is None:
+                    new_episodes.setdefault(season_number, []).append(episode)
+                    continue
+                for quality in episode["telegram"]:
+                    if quality.get("quality") in existing_episode:
+                        changes.append((season_number, episode_number, quality, existing_episode[quality.get("quality")]))
+                    else:
+                        new_qualities.setdefault((season_number, episode_number), []).append(quality)
+
+        ops = []
+        if new_seasons:
+            ops.append(UpdateOne(
+                {"_id": doc_id, "seasons.season_number": {"$nin": [s["season_number"] for s in new_seasons]}},
+                {"$push": {"seasons": {"$each": new_seasons}}, "$set": updated_on}
+            ))
+        if new_episodes:
+            pushes, array_filters, guards = {}, [], []
+            for i, (season_number, episodes) in enumerate(new_episodes.items()):
+                pushes[f"seasons.$[s{i}].episodes"] = {"$each": episodes}
+                array_filters.append({f"s{i}.season_number": season_number})
+                guards.append({"seasons": {"$elemMatch": {
+                    "season_number": season_number,
+                    "episodes.episode_number": {"$nin": [e["episode_number"] for e in episodes]}
+                }}})
+            ops.append(UpdateOne(
+                {"_id": doc_id, "$and": guards}, {"$push": pushes, "$set": updated_on}, array_filters=array_filters
+            ))
+        if new_qualities:
+            pushes, array_filters, guards = {}, [], []
+            for i, ((season_number, episode_number), qualities) in enumerate(new_qualities.items()):
+                pushes[f"seasons.$[s{i}].episodes.$[e{i}].telegram"] = {"$each": qualities}
+                array_filters += [{f"s{i}.season_number": season_number}, {f"e{i}.episode_number": episode_number}]
+                guards.append({"seasons": {"$elemMatch": {"season_number": season_number, "episodes": {"$elemMatch": {
+                    "episode_number": episode_number,
+                    "telegram.quality": {"$nin": [q.get("quality") for q in qualities]}
+                }}}}})
+            ops.append(UpdateOne(
+                {"_id": doc_id, "$and": guards}, {"$push": pushes, "$set": updated_on}, array_filters=array_filters
+            ))
+        if changes:
+            updates, array_filters, guards = dict(updated_on), [], []
+            for i, (season_number, episode_number, quality, old_id) in enumerate(changes):
+                updates[f"seasons.$[s{i}].episodes.$[e{i}].telegram.$[q{i}]"] = quality
+                array_filters += [
+                    {f"s{i}.season_number": season_number},
+                    {f"e{i}.episode_number": episode_number},
+                    {f"q{i}.quality": quality.get("quality"), f"q{i}.id": old_id},
+                ]
+                guards.append({"seasons": {"$elemMatch": {"season_number": season_number, "episodes": {"$elemMatch": {
+                    "episode_number": episode_number,
+                    "telegram": {"$elemMatch": {"quality": quality.get("quality"), "id": old_id}}
+                }}}}})
+                if old_id and old_id != quality.get("id"):
+                    replaced.append(old_id)
+            ops.append(UpdateOne({"_id": doc_id, "$and": guards}, {"$set": updates}, array_filters=array_filters))
+        return ops, replaced
+
+    async def _run_bulk(self, db_index: int, collection_name: str, plans: List[dict]) -> List[dict]:
+        """Runs the plans' updates as one unordered bulk_write and returns the plans that did not fully apply."""
+        ops, owners = [], []
+        for plan in plans:
+            ops.extend(plan["ops"])
+            owners.extend([plan] * len(plan["ops"]))
+        if not ops:
+            return []
+        try:
+            result = await self.dbs[f"storage_{db_index}"][collection_name].bulk_write(ops, ordered=False)
+        except Exception as e:
+            LOGGER.error(f"Batched write to storage_{db_index}.{collection_name} failed, retrying files one by one: {e}")
+            return plans
+
+        failed = []
+        raced_upserts = 0
+        for index, plan in enumerate(owners):
+            if not plan["upsert"]:
+                continue
+            if index in result.upserted_ids:
+                plan["doc_id"] = result.upserted_ids[index]
+            else:
+                # The title appeared since it was probed; $setOnInsert matched it and changed nothing.
+                raced_upserts += 1
+                failed.append(plan)
+        updates = sum(1 for plan in owners if not plan["upsert"])
+        if result.matched_count - raced_upserts < updates:
+            # Per-op match counts aren't reported, so re-apply every in-place plan of this bulk; the
+            # guarded single-file path is idempotent for the parts that did land.
+            failed.extend(plan for plan in plans if not plan["upsert"])
+        return failed
+
+    async def sort_movies(self, sort_params, page, page_size, genre_filter=None, cursor=None):
         sort_dict = self._get_sort_dict(sort_params)
         filter_dict = {"genres": {"$in": [genre_filter]}} if genre_filter else {}
-        results, dbs_checked, total_count = await self._paginate_collection(
-            "movie", sort_dict, page, page_size, filter_dict=filter_dict
+        results, dbs_checked, total_count, next_cursor = await self._paginate_collection(
+            "movie", sort_dict, page, page_size, filter_dict=filter_dict, cursor=cursor
         )
         total_pages = (total_count + page_size - 1) // page_size
         return {
@@ -422,14 +1109,15 @@ class Database:
             "total_pages": total_pages,
             "databases_checked": dbs_checked,
             "current_page": page,
+            "next_cursor": next_cursor,
             "movies": [convert_objectid_to_str(result) for result in results],
         }
 
-    async def sort_tv_shows(self, sort_params, page, page_size, genre_filter=None):
+    async def sort_tv_shows(self, sort_params, page, page_size, genre_filter=None, cursor=None):
         sort_dict = self._get_sort_dict(sort_params)
         filter_dict = {"genres": {"$in": [genre_filter]}} if genre_filter else {}
-        results, dbs_checked, total_count = await self._paginate_collection(
-            "tv", sort_dict, page, page_size, filter_dict=filter_dict
+        results, dbs_checked, total_count, next_cursor = await self._paginate_collection(
+            "tv", sort_dict, page, page_size, filter_dict=filter_dict, cursor=cursor
         )
         total_pages = (total_count + page_size - 1) // page_size
         return {
@@ -437,16 +1125,54 @@ class Database:
             "total_pages": total_pages,
             "databases_checked": dbs_checked,
             "current_page": page,
+            "next_cursor": next_cursor,
             "tv_shows": [convert_objectid_to_str(result) for result in results],
         }
 
 
 
     async def search_documents(
+        self,
+        query: str,
+        page: int,
+        page_size: int,
+        media_type: Optional[str] = None
+    ) -> dict:
+        if not search_index.ready:
+            return await self._regex_search_documents(query, page, page_size, media_type)
+
+        skip = (page - 1) * page_size
+        total_count, matches = search_index.search(query, media_type, limit=skip + page_size)
+        page_docs = matches[skip:]
+
+        grouped: Dict[Tuple[int, str], List[int]] = {}
+        for doc in page_docs:
+            grouped.setdefault((doc.db_index, doc.media_type), []).append(doc.tmdb_id)
+
+        fetched = await self._gather_shards({
+            (db_index, collection_name): self.dbs[f"storage_{db_index}"][collection_name].find(
+                {"tmdb_id": {"$in": tmdb_ids}}, SEARCH_PROJECTIONS[collection_name]
+            ).to_list(None)
+            for (db_index, collection_name), tmdb_ids in grouped.items()
+        })
+        found = {
+            (collection_name, document["tmdb_id"]): document
+            for (_, collection_name), documents in fetched.items()
+            for document in documents
+        }
+
+        results = [found.get((doc.media_type, doc.tmdb_id)) for doc in page_docs]
+        return {
+            "total_count": total_count,
+            "results": [convert_objectid_to_str(document) for document in results if document]
+        }
+
+    async def _regex_search_documents(
             self, 
             query: str, 
             page: int, 
-            page_size: int
+            page_size: int,
+            media_type: Optional[str] = None
         ) -> dict:
 
             skip = (page - 1) * page_size
@@ -462,11 +1188,7 @@ class Database:
                     {"title": regex_query},
                     {"seasons.episodes.telegram.name": regex_query}
                 ]}},
-                {"$project": {
-                    "_id": 1, "tmdb_id": 1, "title": 1, "genres": 1, "rating": 1, "imdb_id": 1,
-                    "release_year": 1, "poster": 1, "backdrop": 1, "description": 1, "logo": 1,
-                    "media_type": 1, "db_index": 1
-                }}
+                {"$project": SEARCH_PROJECTIONS["tv"]}
             ]
             
             movie_pipeline = [
@@ -474,59 +1196,25 @@ class Database:
                     {"title": regex_query},
                     {"telegram.name": regex_query}
                 ]}},
-                {"$project": {
-                    "_id": 1, "tmdb_id": 1, "title": 1, "genres": 1, "rating": 1,
-                    "release_year": 1, "poster": 1, "backdrop": 1, "description": 1,
-                    "media_type": 1, "db_index": 1, "imdb_id": 1, "logo": 1
-                }}
+                {"$project": SEARCH_PROJECTIONS["movie"]}
             ]
             
-            results = []
-            dbs_checked = []
-            
-            active_db_key = f"storage_{self.current_db_index}"
-            active_db = self.dbs[active_db_key]
-            dbs_checked.append(self.current_db_index)
-            
-            tv_results = await active_db["tv"].aggregate(tv_pipeline).to_list(None)
-            movie_results = await active_db["movie"].aggregate(movie_pipeline).to_list(None)
-            combined = tv_results + movie_results
-            results.extend(combined)
-            
-            if len(results) < page_size:
-                previous_db_index = self.current_db_index - 1
-                while previous_db_index > 0 and len(results) < page_size:
-                    prev_db_key = f"storage_{previous_db_index}"
-                    prev_db = self.dbs[prev_db_key]
-                    tv_results_prev = await prev_db["tv"].aggregate(tv_pipeline).to_list(None)
-                    movie_results_prev = await prev_db["movie"].aggregate(movie_pipeline).to_list(None)
-                    combined_prev = tv_results_prev + movie_results_prev
-                    results.extend(combined_prev)
-                    dbs_checked.append(previous_db_index)
-                    previous_db_index -= 1
-
-            total_count = 0
-            for db_index in dbs_checked:
-                key = f"storage_{db_index}"
-                db = self.dbs[key]
-                tv_count = await db["tv"].count_documents({
-                    "$or": [
-                        {"title": regex_query},
-                        {"seasons.episodes.telegram.name": regex_query}
-                    ]
-                })
-                movie_count = await db["movie"].count_documents({
-                    "$or": [
-                        {"title": regex_query},
-                        {"telegram.name": regex_query}
-                    ]
-                })
-                total_count += (tv_count + movie_count)
-            
+            pipelines = {"tv": tv_pipeline, "movie": movie_pipeline}
+            if media_type:
+                pipelines = {media_type: pipelines[media_type]}
+
+            async def search_shard(_, db):
+                # Every match is fetched anyway, so the count is taken from them rather than
+                # from a second count_documents that could cover other media types.
+                found = await gather(*(db[mt].aggregate(pipeline).to_list(None) for mt, pipeline in pipelines.items()))
+                return [doc for docs in found for doc in docs]
+
+            found = await self.fan_out(search_shard, list(range(self.current_db_index, 0, -1)))
+            results = [doc for db_index in sorted(found, reverse=True) for doc in found[db_index]]
             paged_results = results[skip:skip + page_size]
 
             return {
-                "total_count": total_count,
+                "total_count": len(results),
                 "results": [convert_objectid_to_str(doc) for doc in paged_results]
             }
 
@@ -584,6 +1272,367 @@ class Database:
             return None
 
 
+    # -------------------------------
+    # File Registry (tracking DB)
+    # -------------------------------
+
+    async def _registry_entries(self, media_type: str, doc: dict, db_index: int) -> List[dict]:
+        slots = []
+        if media_type == "tv":
+            for season in doc.get("seasons", []):
+                for episode in season.get("episodes", []):
+                    for quality in episode.get("telegram") or []:
+                        slots.append((season.get("season_number"), episode.get("episode_number"), quality))
+        else:
+            slots = [(None, None, quality) for quality in doc.get("telegram") or []]
+
+        entries = []
+        for season_number, episode_number, quality in slots:
+            try:
+                decoded = await decode_string(quality["id"])
+            except Exception as e:
+                LOGGER.error(f"Registry skipped undecodable quality of {doc.get('tmdb_id')}: {e}")
+                continue
+            entries.append({
+                "_id": quality["id"],
+                "chat_id": int(decoded["chat_id"]),
+                "msg_id": int(decoded["msg_id"]),
+                "media_type": media_type,
+                "tmdb_id": doc.get("tmdb_id"),
+                "title": doc.get("title"),
+                "season_number": season_number,
+                "episode_number": episode_number,
+                "quality": quality.get("quality"),
+                "db_index": db_index,
+            })
+        return entries
+
+    async def _registry_ops(self, media_type: str, media_dict: dict, db_index: int) -> list:
+        # The title may have just moved shards; keep all of its entries pointing at the right one.
+        ops = [UpdateMany(
+            {"media_type": media_type, "tmdb_id": media_dict["tmdb_id"]},
+            {"$set": {"db_index": db_index}}
+        )]
+        for entry in await self._registry_entries(media_type, media_dict, db_index):
+            # A replaced quality's old message is deleted, so drop its entry along with it.
+            ops.append(DeleteMany({
+                "media_type": media_type, "tmdb_id": entry["tmdb_id"],
+                "season_number": entry["season_number"], "episode_number": entry["episode_number"],
+                "quality": entry["quality"], "_id": {"$ne": entry["_id"]}
+            }))
+            ops.append(DeleteMany({
+                "chat_id": entry["chat_id"], "msg_id": entry["msg_id"], "_id": {"$ne": entry["_id"]}
+            }))
+            ops.append(ReplaceOne({"_id": entry["_id"]}, entry, upsert=True))
+        return ops
+
+    async def register_files(self, media_type: str, media_dict: dict, db_index: int):
+        await self.register_files_batch([(media_type, media_dict, db_index)])
+
+    async def register_files_batch(self, registrations: List[Tuple[str, dict, int]]):
+        ops = []
+        for media_type, media_dict, db_index in registrations:
+            ops.extend(await self._registry_ops(media_type, media_dict, db_index))
+        try:
+            # Ordered, so each entry's stale duplicates are removed before it is upserted.
+            await self.dbs["tracking"]["files"].bulk_write(ops, ordered=True)
+        except Exception as e:
+            tmdb_ids = ", ".join(str(media_dict.get("tmdb_id")) for _, media_dict, _ in registrations)
+            LOGGER.error(f"Failed to update file registry for {tmdb_ids}: {e}")
+        for media_type, media_dict, db_index in registrations:
+            await self.update_directory(
+                media_type, media_dict["tmdb_id"], media_dict.get("title"), media_dict.get("release_year"), db_index
+            )
+            search_index.add(media_type, media_dict, db_index, self._file_names(media_type, media_dict))
+
+    async def unregister_files(self, filter_dict: dict):
+        try:
+            await self.dbs["tracking"]["files"].delete_many(filter_dict)
+        except Exception as e:
+            LOGGER.error(f"Failed to remove file registry entries {filter_dict}: {e}")
+
+    async def sync_registered_document(self, media_type: str, tmdb_id: int, db_index: int):
+        doc = await self.dbs[f"storage_{db_index}"][media_type].find_one({"tmdb_id": tmdb_id})
+        await self.unregister_files({"media_type": media_type, "tmdb_id": tmdb_id})
+        search_index.remove(media_type, tmdb_id)
+        self.invalidate_counts(media_type)
+        if doc:
+            await self.register_files(media_type, doc, db_index)
+        else:
+            await self.remove_from_directory(media_type, tmdb_id)
+
+    async def rebuild_file_registry(self):
+        registry = self.dbs["tracking"]["files"]
+        LOGGER.info("Building file registry from storage DBs...")
+        total = 0
+        try:
+            await registry.delete_many({})
+            total_storage_dbs = len(self.dbs) - 1
+            for db_index in range(1, total_storage_dbs + 1):
+                db = self.dbs[f"storage_{db_index}"]
+                projections = (
+                    ("movie", {"tmdb_id": 1, "title": 1, "telegram.id": 1, "telegram.quality": 1}),
+                    ("tv", {"tmdb_id": 1, "title": 1, "seasons.season_number": 1, "seasons.episodes.episode_number": 1,
+                            "seasons.episodes.telegram.id": 1, "seasons.episodes.telegram.quality": 1}),
+                )
+                for media_type, projection in projections:
+                    async for doc in db[media_type].find({}, projection):
+                        entries = await self._registry_entries(media_type, doc, db_index)
+                        if entries:
+                            try:
+                                await registry.insert_many(entries, ordered=False)
+                            except Exception as e:
+                                LOGGER.warning(f"File registry: duplicate files under {doc.get('tmdb_id')}: {e}")
+                            total += len(entries)
+            await self.dbs["tracking"]["state"].update_one(
+                {"_id": "file_registry"}, {"$set": {"built": True}}, upsert=True
+            )
+            self.file_registry_ready = True
+            LOGGER.info(f"File registry built with {total} files.")
+        except Exception as e:
+            LOGGER.error(f"Failed to build file registry: {e}")
+
+    async def get_registered_file(self, quality_id: str) -> Optional[dict]:
+        return await self.dbs["tracking"]["files"].find_one({"_id": quality_id})
+
+    async def file_exists(self, chat_id: int, msg_id: int) -> bool:
+        return await self.dbs["tracking"]["files"].find_one(
+            {"chat_id": int(chat_id), "msg_id": int(msg_id)}, {"_id": 1}
+        ) is not None
+
+    def _registered_db_indexes(self, entry: Optional[dict]) -> List[int]:
+        # Fall back to every shard for files the registry doesn't know yet.
+        if entry and entry.get("db_index"):
+            return [entry["db_index"]]
+        return list(range(1, len(self.dbs)))
+
+    # -------------------------------
+    # Shard Directory (tracking DB)
+    # -------------------------------
+
+    # Where each title lives, so placing a write is one lookup instead of a probe of every shard.
+    # Entries: {_id: "<media_type>:<tmdb_id>", media_type, tmdb_id, title, release_year, db_index}
+
+    def _cache_directory_entry(self, entry: dict):
+        key = (entry["media_type"], entry["tmdb_id"])
+        previous = self.directory.get(key)
+        if previous:
+            title_key = (previous["media_type"], previous["title"], previous["release_year"])
+            if self.directory_titles.get(title_key) == previous["db_index"]:
+                del self.directory_titles[title_key]
+        self.directory[key] = entry
+        self.directory_titles[(entry["media_type"], entry["title"], entry["release_year"])] = entry["db_index"]
+
+    async def load_shard_directory(self):
+        try:
+            state = await self.dbs["tracking"]["state"].find_one({"_id": "shard_directory"})
+            if not state or not state.get("built"):
+                await self.rebuild_shard_directory()
+                return
+            async for entry in self.dbs["tracking"]["directory"].find({}):
+                self._cache_directory_entry(entry)
+            self.directory_ready = True
+            LOGGER.info(f"Shard directory loaded with {len(self.directory)} titles.")
+        except Exception as e:
+            LOGGER.error(f"Failed to load shard directory: {e}")
+
+    async def rebuild_shard_directory(self):
+        directory = self.dbs["tracking"]["directory"]
+        LOGGER.info("Building shard directory from storage DBs...")
+        self.directory_complete = False
+        try:
+            await directory.delete_many({})
+            self.directory.clear()
+            self.directory_titles.clear()
+            total_storage_dbs = len(self.dbs) - 1
+            for db_index in range(1, total_storage_dbs + 1):
+                db = self.dbs[f"storage_{db_index}"]
+                for media_type in ("movie", "tv"):
+                    entries = []
+                    async for doc in db[media_type].find({}, {"tmdb_id": 1, "title": 1, "release_year": 1}):
+                        entry = {
+                            "_id": f"{media_type}:{doc.get('tmdb_id')}",
+                            "media_type": media_type,
+                            "tmdb_id": doc.get("tmdb_id"),
+                            "title": doc.get("title"),
+                            "release_year": doc.get("release_year"),
+                            "db_index": db_index,
+                        }
+                        if (media_type, entry["tmdb_id"]) in self.directory:
+                            LOGGER.warning(f"Shard directory: {entry['_id']} stored on more than one DB")
+                            continue
+                        self._cache_directory_entry(entry)
+                        entries.append(entry)
+                    if entries:
+                        # Upserts, since update_directory may write the same entries while this runs.
+                        await directory.bulk_write(
+                            [ReplaceOne({"_id": entry["_id"]}, entry, upsert=True) for entry in entries], ordered=False
+                        )
+            await self.dbs["tracking"]["state"].update_one(
+                {"_id": "shard_directory"}, {"$set": {"built": True}}, upsert=True
+            )
+            self.directory_ready = True
+            self.directory_complete = True
+            LOGGER.info(f"Shard directory built with {len(self.directory)} titles.")
+        except Exception as e:
+            LOGGER.error(f"Failed to build shard directory: {e}")
+
+    async def update_directory(self, media_type: str, tmdb_id: int, title: str, release_year: Any, db_index: int):
+        current = self.directory.get((media_type, tmdb_id))
+        if current and (current["title"], current["release_year"], current["db_index"]) == (title, release_year, db_index):
+            return
+        entry = {
+            "_id": f"{media_type}:{tmdb_id}",
+            "media_type": media_type,
+            "tmdb_id": tmdb_id,
+            "title": title,
+            "release_year": release_year,
+            "db_index": db_index,
+        }
+        self._cache_directory_entry(entry)
+        try:
+            await self.dbs["tracking"]["directory"].replace_one({"_id": entry["_id"]}, entry, upsert=True)
+        except Exception as e:
+            LOGGER.error(f"Failed to update shard directory for {entry['_id']}: {e}")
+            # The cached entry keeps this process right; make the next start rebuild the stored copy.
+            try:
+                await self.dbs["tracking"]["state"].update_one(
+                    {"_id": "shard_directory"}, {"$set": {"built": False}}, upsert=True
+                )
+            except Exception as e:
+                LOGGER.error(f"Failed to mark shard directory for rebuild: {e}")
+
+    async def remove_from_directory(self, media_type: str, tmdb_id: int):
+        entry = self.directory.pop((media_type, tmdb_id), None)
+        if entry:
+            title_key = (media_type, entry["title"], entry["release_year"])
+            if self.directory_titles.get(title_key) == entry["db_index"]:
+                del self.directory_titles[title_key]
+        try:
+            await self.dbs["tracking"]["directory"].delete_one({"_id": f"{media_type}:{tmdb_id}"})
+        except Exception as e:
+            LOGGER.error(f"Failed to remove {media_type}:{tmdb_id} from shard directory: {e}")
+
+    # -------------------------------
+    # Search Index
+    # -------------------------------
+
+    @staticmethod
+    def _file_names(media_type: str, doc: dict) -> List[str]:
+        if media_type == "tv":
+            return [
+                quality.get("name") or ""
+                for season in doc.get("seasons", [])
+                for episode in season.get("episodes", [])
+                for quality in episode.get("telegram") or []
+            ]
+        return [quality.get("name") or "" for quality in doc.get("telegram") or []]
+
+    async def reindex_document(self, media_type: str, tmdb_id: int, db_index: int):
+        # Index entries only ever gain terms, so dropped or replaced files need a rebuild from the stored title.
+        try:
+            doc = await self.dbs[f"storage_{db_index}"][media_type].find_one(
+                {"tmdb_id": tmdb_id}, INDEX_PROJECTIONS[media_type]
+            )
+        except Exception as e:
+            LOGGER.error(f"Failed to reindex {media_type} {tmdb_id}: {e}")
+            return
+        search_index.remove(media_type, tmdb_id)
+        if doc:
+            search_index.add(media_type, doc, db_index, self._file_names(media_type, doc))
+
+    async def build_search_index(self):
+        try:
+            search_index.clear()
+            total_storage_dbs = len(self.dbs) - 1
+            for db_index in range(1, total_storage_dbs + 1):
+                db = self.dbs[f"storage_{db_index}"]
+                for media_type, projection in INDEX_PROJECTIONS.items():
+                    async for doc in db[media_type].find({}, projection):
+                        search_index.add(media_type, doc, db_index, self._file_names(media_type, doc), bulk=True)
+            search_index.finish_bulk()
+            LOGGER.info(f"Search index built with {len(search_index)} titles and {len(search_index.postings)} terms.")
+        except Exception as e:
+            LOGGER.error(f"Failed to build search index: {e}")
+
+    # -------------------------------
+    # Stored File Properties
+    # -------------------------------
+
+    async def get_file_details(self, quality_id: str) -> Optional[dict]:
+        entry = await self.get_registered_file(quality_id)
+        for db_index in self._registered_db_indexes(entry):
+            db = self.dbs[f"storage_{db_index}"]
+            if not entry or entry["media_type"] == "movie":
+                movie = await db["movie"].find_one({"telegram.id": quality_id}, {"telegram.$": 1})
+                if movie and movie.get("telegram"):
+                    return movie["telegram"][0]
+                if entry:
+                    continue
+
+            pipeline = [
+                {"$match": {"seasons.episodes.telegram.id": quality_id}},
+                {"$unwind": "$seasons"},
+                {"$unwind": "$seasons.episodes"},
+                {"$unwind": "$seasons.episodes.telegram"},
+                {"$match": {"seasons.episodes.telegram.id": quality_id}},
+                {"$replaceRoot": {"newRoot": "$seasons.episodes.telegram"}},
+                {"$limit": 1}
+            ]
+            episode_quality = await db["tv"].aggregate(pipeline).to_list(1)
+            if episode_quality:
+                return episode_quality[0]
+        return None
+
+    async def get_next_episode_quality(self, quality_id: str) -> Optional[dict]:
+        entry = await self.get_registered_file(quality_id)
+        if entry and entry["media_type"] != "tv":
+            return None
+        for db_index in self._registered_db_indexes(entry):
+            tv = await self.dbs[f"storage_{db_index}"]["tv"].find_one(
+                {"seasons.episodes.telegram.id": quality_id}, {"seasons": 1}
+            )
+            if not tv:
+                continue
+
+            episodes = [
+                (season["season_number"], episode)
+                for season in sorted(tv.get("seasons", []), key=lambda s: s.get("season_number"))
+                for episode in sorted(season.get("episodes", []), key=lambda e: e.get("episode_number"))
+            ]
+            for position, (_, episode) in enumerate(episodes):
+                current = next((q for q in episode.get("telegram") or [] if q.get("id") == quality_id), None)
+                if not current:
+                    continue
+                for _, next_episode in episodes[position + 1:]:
+                    qualities = next_episode.get("telegram") or []
+                    if qualities:
+                        return next((q for q in qualities if q.get("quality") == current.get("quality")), qualities[0])
+                return None
+        return None
+
+    async def update_file_details(self, quality_id: str, details: Dict[str, Any]) -> bool:
+        array_filters = [{"q.id": quality_id}]
+        modified = 0
+        for db_index in self._registered_db_indexes(await self.get_registered_file(quality_id)):
+            db = self.dbs[f"storage_{db_index}"]
+            try:
+                movie_result = await db["movie"].update_many(
+                    {"telegram.id": quality_id},
+                    {"$set": {f"telegram.$[q].{key}": value for key, value in details.items()}},
+                    array_filters=array_filters
+                )
+                tv_result = await db["tv"].update_many(
+                    {"seasons.episodes.telegram.id": quality_id},
+                    {"$set": {f"seasons.$[].episodes.$[].telegram.$[q].{key}": value for key, value in details.items()}},
+                    array_filters=array_filters
+                )
+                modified += movie_result.modified_count + tv_result.modified_count
+            except Exception as e:
+                LOGGER.error(f"Failed to update file details in storage_{db_index}: {e}")
+        return modified > 0
+
+
     # -------------------------------
     # DB Method for Edit Post
     # -------------------------------
@@ -611,6 +1660,8 @@ class Database:
 
         try:
             result = await collection.update_one({"tmdb_id": int(tmdb_id)}, {"$set": update_data})
+            if result.modified_count > 0:
+                await self.sync_registered_document(collection_name, int(tmdb_id), int(db_index))
 
             return result.modified_count > 0
 
@@ -643,6 +1694,7 @@ class Database:
                     LOGGER.info(f"Deleted document tmdb_id {tmdb_id} from {db_key}")
                     self.current_db_index = next_db_index
                     await self.update_current_db_index()
+                    await self.sync_registered_document(collection_name, int(tmdb_id), next_db_index)
                     LOGGER.info(f"Switched to {new_db_key} and document migrated successfully.")
                     return True
 
@@ -689,6 +1741,10 @@ class Database:
             result = await self.dbs[db_key]["tv"].delete_one({"tmdb_id": tmdb_id})
         
         if result.deleted_count > 0:
+            await self.unregister_files({"media_type": "movie" if media_type == "Movie" else "tv", "tmdb_id": tmdb_id})
+            search_index.remove("movie" if media_type == "Movie" else "tv", tmdb_id)
+            self.invalidate_counts("movie" if media_type == "Movie" else "tv")
+            await self.remove_from_directory("movie" if media_type == "Movie" else "tv", tmdb_id)
             LOGGER.info(f"{media_type} with tmdb_id {tmdb_id} deleted successfully.")
             return True
         LOGGER.info(f"No document found with tmdb_id {tmdb_id}.")
@@ -697,157 +1753,93 @@ class Database:
 
     # Delete a specific quality from movie
     async def delete_movie_quality(self, tmdb_id: int, db_index: int, quality: str) -> bool:
-        db_key = f"storage_{db_index}"
-        movie = await self.dbs[db_key]["movie"].find_one({"tmdb_id": tmdb_id})
-        
-        if not movie or "telegram" not in movie:
-            return False
-
-        for q in movie["telegram"]:
-            if q.get("quality") == quality:
-                try:
-                    old_id = q.get("id")
-                    if old_id:
-                        decoded_data = await decode_string(old_id)
-                        chat_id = int(f"-100{decoded_data['chat_id']}")
-                        msg_id = int(decoded_data['msg_id'])
-                        create_task(delete_message(chat_id, msg_id))
-                except Exception as e:
-                    LOGGER.error(f"Failed to queue file for deletion: {e}")
-                break
-        
-        original_len = len(movie["telegram"])
-        movie["telegram"] = [q for q in movie["telegram"] if q.get("quality") != quality]
-        
-        if len(movie["telegram"]) == original_len:
+        collection = self.dbs[f"storage_{db_index}"]["movie"]
+        old_ids = await self._quality_ids(collection, {"tmdb_id": tmdb_id}, quality=quality)
+        result = await collection.update_one(
+            {"tmdb_id": tmdb_id, "telegram.quality": quality},
+            {"$pull": {"telegram": {"quality": quality}}, "$set": {"updated_on": datetime.utcnow()}}
+        )
+        if not result.modified_count:
             return False
-        
-        movie['updated_on'] = datetime.utcnow()
-        result = await self.dbs[db_key]["movie"].replace_one({"tmdb_id": tmdb_id}, movie)
-        return result.modified_count > 0
+        self._queue_message_deletion(old_ids)
+        await self.unregister_files({"media_type": "movie", "tmdb_id": tmdb_id, "quality": quality})
+        await self.reindex_document("movie", tmdb_id, db_index)
+        return True
 
     # Delete a specific episode from a TV show
     async def delete_tv_episode(self, tmdb_id: int, db_index: int, season_number: int, episode_number: int) -> bool:
-        db_key = f"storage_{db_index}"
-        tv = await self.dbs[db_key]["tv"].find_one({"tmdb_id": tmdb_id})
-        
-        if not tv or "seasons" not in tv:
-            return False
-        
-        found = False
-        for season in tv["seasons"]:
-            if season.get("season_number") == season_number:
-                for ep in season["episodes"]:
-                    if ep.get("episode_number") == episode_number:
-                        for quality in ep.get("telegram", []):
-                            try:
-                                old_id = quality.get("id")
-                                if old_id:
-                                    decoded_data = await decode_string(old_id)
-                                    chat_id = int(f"-100{decoded_data['chat_id']}")
-                                    msg_id = int(decoded_data['msg_id'])
-                                    create_task(delete_message(chat_id, msg_id))
-                            except Exception as e:
-                                LOGGER.error(f"Failed to queue file for deletion: {e}")
-                        break
-                
-                original_len = len(season["episodes"])
-                season["episodes"] = [ep for ep in season["episodes"] if ep.get("episode_number") != episode_number]
-                found = original_len > len(season["episodes"])
-                break
-        
-        if not found:
+        collection = self.dbs[f"storage_{db_index}"]["tv"]
+        old_ids = await self._quality_ids(collection, {"tmdb_id": tmdb_id}, season_number, episode_number)
+        result = await collection.update_one(
+            {"tmdb_id": tmdb_id, "seasons": {"$elemMatch": {
+                "season_number": season_number, "episodes.episode_number": episode_number
+            }}},
+            {
+                "$pull": {"seasons.$[s].episodes": {"episode_number": episode_number}},
+                "$set": {"updated_on": datetime.utcnow()}
+            },
+            array_filters=[{"s.season_number": season_number}]
+        )
+        if not result.modified_count:
             return False
-        
-        tv['updated_on'] = datetime.utcnow()
-        result = await self.dbs[db_key]["tv"].replace_one({"tmdb_id": tmdb_id}, tv)
-        return result.modified_count > 0
+        self._queue_message_deletion(old_ids)
+        await self.unregister_files({"media_type": "tv", "tmdb_id": tmdb_id, "season_number": season_number, "episode_number": episode_number})
+        await self.reindex_document("tv", tmdb_id, db_index)
+        return True
 
     # Delete a whole season from a TV show
     async def delete_tv_season(self, tmdb_id: int, db_index: int, season_number: int) -> bool:
-        db_key = f"storage_{db_index}"
-        tv = await self.dbs[db_key]["tv"].find_one({"tmdb_id": tmdb_id})
-        
-        if not tv or "seasons" not in tv:
-            return False
-        
-        for season in tv["seasons"]:
-            if season.get("season_number") == season_number:
-                for episode in season.get("episodes", []):
-                    for quality in episode.get("telegram", []):
-                        try:
-                            old_id = quality.get("id")
-                            if old_id:
-                                decoded_data = await decode_string(old_id)
-                                chat_id = int(f"-100{decoded_data['chat_id']}")
-                                msg_id = int(decoded_data['msg_id'])
-                                create_task(delete_message(chat_id, msg_id))
-                        except Exception as e:
-                            LOGGER.error(f"Failed to queue file for deletion: {e}")
-                break
-        
-        original_len = len(tv["seasons"])
-        tv["seasons"] = [s for s in tv["seasons"] if s.get("season_number") != season_number]
-        
-        if len(tv["seasons"]) == original_len:
+        collection = self.dbs[f"storage_{db_index}"]["tv"]
+        old_ids = await self._quality_ids(collection, {"tmdb_id": tmdb_id}, season_number)
+        result = await collection.update_one(
+            {"tmdb_id": tmdb_id, "seasons.season_number": season_number},
+            {"$pull": {"seasons": {"season_number": season_number}}, "$set": {"updated_on": datetime.utcnow()}}
+        )
+        if not result.modified_count:
             return False
-        
-        tv['updated_on'] = datetime.utcnow()
-        result = await self.dbs[db_key]["tv"].replace_one({"tmdb_id": tmdb_id}, tv)
-        return result.modified_count > 0
+        self._queue_message_deletion(old_ids)
+        await self.unregister_files({"media_type": "tv", "tmdb_id": tmdb_id, "season_number": season_number})
+        await self.reindex_document("tv", tmdb_id, db_index)
+        return True
 
     # Delete a specific quality from a given TV episode
     async def delete_tv_quality(self, tmdb_id: int, db_index: int, season_number: int, episode_number: int, quality: str) -> bool:
-        db_key = f"storage_{db_index}"
-        tv = await self.dbs[db_key]["tv"].find_one({"tmdb_id": tmdb_id})
-        
-        if not tv or "seasons" not in tv:
-            return False
-        
-        found = False
-        for season in tv["seasons"]:
-            if season.get("season_number") == season_number:
-                for episode in season["episodes"]:
-                    if episode.get("episode_number") == episode_number and "telegram" in episode:
-                        for q in episode["telegram"]:
-                            if q.get("quality") == quality:
-                                try:
-                                    old_id = q.get("id")
-                                    if old_id:
-                                        decoded_data = await decode_string(old_id)
-                                        chat_id = int(f"-100{decoded_data['chat_id']}")
-                                        msg_id = int(decoded_data['msg_id'])
-                                        create_task(delete_message(chat_id, msg_id))
-                                except Exception as e:
-                                    LOGGER.error(f"Failed to queue file for deletion: {e}")
-                                break
-                        
-                        original_len = len(episode["telegram"])
-                        episode["telegram"] = [q for q in episode["telegram"] if q.get("quality") != quality]
-                        found = original_len > len(episode["telegram"])
-                        break
-        
-        if not found:
+        collection = self.dbs[f"storage_{db_index}"]["tv"]
+        old_ids = await self._quality_ids(collection, {"tmdb_id": tmdb_id}, season_number, episode_number, quality)
+        result = await collection.update_one(
+            {"tmdb_id": tmdb_id, "seasons": {"$elemMatch": {"season_number": season_number, "episodes": {"$elemMatch": {
+                "episode_number": episode_number, "telegram.quality": quality
+            }}}}},
+            {
+                "$pull": {"seasons.$[s].episodes.$[e].telegram": {"quality": quality}},
+                "$set": {"updated_on": datetime.utcnow()}
+            },
+            array_filters=[{"s.season_number": season_number}, {"e.episode_number": episode_number}]
+        )
+        if not result.modified_count:
             return False
-        tv['updated_on'] = datetime.utcnow()
-        result = await self.dbs[db_key]["tv"].replace_one({"tmdb_id": tmdb_id}, tv)
-        return result.modified_count > 0
+        self._queue_message_deletion(old_ids)
+        await self.unregister_files({"media_type": "tv", "tmdb_id": tmdb_id, "season_number": season_number, "episode_number": episode_number, "quality": quality})
+        await self.reindex_document("tv", tmdb_id, db_index)
+        return True
 
 
     # Get per-DB statistics (movies, tv shows, used size, etc.)
     async def get_database_stats(self):
-        stats = []
-        for key in self.dbs.keys():
-            if key.startswith("storage_"):
-                db = self.dbs[key]
-                movie_count = await db["movie"].count_documents({})
-                tv_count = await db["tv"].count_documents({})
-                db_stats = await db.command("dbstats")
-                stats.append({
-                    "db_name": key,
-                    "movie_count": movie_count,
-                    "tv_count": tv_count,
-                    "storageSize": db_stats.get("storageSize", 0),
-                    "dataSize": db_stats.get("dataSize", 0)
-                })
+        async def shard_stats(db_index, db):
+            movie_count, tv_count, db_stats = await gather(
+                db["movie"].count_documents({}),
+                db["tv"].count_documents({}),
+                db.command("dbstats"),
+            )
+            return {
+                "db_name": f"storage_{db_index}",
+                "movie_count": movie_count,
+                "tv_count": tv_count,
+                "storageSize": db_stats.get("storageSize", 0),
+                "dataSize": db_stats.get("dataSize", 0)
+            }
+
+        found = await self.fan_out(shard_stats)
+        stats = [found[db_index] for db_index in sorted(found)]
         return stats
\ No newline at end of file
@@ -0,0 +1,56 @@
+import re
+from typing import Dict, Optional
+
+EWMA_ALPHA = 0.2
+
+# Rough runtimes used to turn a file size into the bitrate a player must sustain.
+ASSUMED_RUNTIME = {"movie": 2 * 60 * 60, "series": 45 * 60}
+BITRATE_HEADROOM = 1.5
+
+
+class DCThroughput:
+    def __init__(self):
+        self.rates: Dict[int, float] = {}
+        self.samples: Dict[int, int] = {}
+
+    def record(self, dc_id: int, nbytes: int, seconds: float):
+        if not nbytes or seconds <= 0:
+            return
+        rate = nbytes / seconds
+        previous = self.rates.get(dc_id)
+        self.rates[dc_id] = rate if previous is None else (EWMA_ALPHA * rate + (1 - EWMA_ALPHA) * previous)
+        self.samples[dc_id] = self.samples.get(dc_id, 0) + 1
+
+    def get(self, dc_id: Optional[int]) -> Optional[float]:
+        return self.rates.get(dc_id) if dc_id is not None else None
+
+    def snapshot(self) -> Dict[int, dict]:
+        return {
+            dc_id: {"bytes_per_second": round(rate), "samples": self.samples.get(dc_id, 0)}
+            for dc_id, rate in self.rates.items()
+        }
+
+
+dc_throughput = DCThroughput()
+
+
+def quality_rank(quality: str) -> int:
+    """
+    >>> quality_rank("4K") > quality_rank("1080p") > quality_rank("480p") > quality_rank("")
+    True
+    """
+    quality = (quality or "").lower()
+    # PTN reports UHD as "4K"; checking it first keeps the digit parse from ranking it as 4.
+    if re.search(r"4k|2160|uhd", quality):
+        return 2160
+    match = re.search(r"(\d{3,4})[pi]", quality)
+    return int(match.group(1)) if match else 0
+
+
+def playback_margin(file_size: Optional[int], dc_id: Optional[int], media_type: str) -> Optional[float]:
+    """Observed DC throughput divided by the bitrate the file needs; >= 1 should play smoothly."""
+    rate = dc_throughput.get(dc_id)
+    if not rate or not file_size:
+        return None
+    required = file_size / ASSUMED_RUNTIME.get(media_type, ASSUMED_RUNTIME["movie"]) * BITRATE_HEADROOM
+    return rate / required
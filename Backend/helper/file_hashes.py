@@ -0,0 +1,26 @@
+from hashlib import sha256
+from typing import Dict, List, Optional, Tuple
+
+# Telegram hashes files in 128 KiB ranges, so a 1 MiB chunk is covered by 8 of them.
+MAX_CHUNK_HASHES = 16
+HashRange = Tuple[int, int, bytes]
+
+
+def covering(hashes: Dict[int, Tuple[int, bytes]], offset: int, length: int) -> Optional[List[HashRange]]:
+    """Contiguous (offset, limit, sha256) ranges from upload.GetFileHashes results that span the chunk."""
+    covered, position = [], offset
+    while position < offset + length:
+        entry = hashes.get(position)
+        if entry is None or not entry[0]:
+            return None
+        covered.append((position, *entry))
+        position += entry[0]
+    return covered
+
+
+def verify(chunk: bytes, offset: int, ranges: List[HashRange]) -> bool:
+    for range_offset, limit, digest in ranges:
+        start = range_offset - offset
+        if sha256(chunk[start:start + limit]).digest() != digest:
+            return False
+    return True
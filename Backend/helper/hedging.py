@@ -0,0 +1,52 @@
+from collections import deque
+from time import monotonic
+from typing import Deque, Dict
+from Backend.config import Telegram
+
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 20
+
+
+class LatencyTracker:
+    def __init__(self):
+        self.samples: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def p95(self) -> float:
+        ordered = sorted(self.samples)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def threshold(self) -> float:
+        if len(self.samples) < MIN_SAMPLES:
+            return Telegram.HEDGE_MIN_DELAY
+        return max(Telegram.HEDGE_MIN_DELAY, self.p95())
+
+
+class HedgeBudget:
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self.window_start = monotonic()
+        self.used = 0
+
+    def try_acquire(self) -> bool:
+        now = monotonic()
+        if now - self.window_start >= 60:
+            self.window_start, self.used = now, 0
+        if self.used >= self.per_minute:
+            return False
+        self.used += 1
+        return True
+
+
+dc_latency: Dict[int, LatencyTracker] = {}
+hedge_budget = HedgeBudget(Telegram.HEDGE_BUDGET_PER_MINUTE)
+hedge_stats = {"hedged": 0, "hedge_won": 0, "budget_exhausted": 0}
+
+
+def get_latency_tracker(dc_id: int) -> LatencyTracker:
+    tracker = dc_latency.get(dc_id)
+    if tracker is None:
+        tracker = dc_latency[dc_id] = LatencyTracker()
+    return tracker
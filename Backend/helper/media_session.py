@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+from pyrogram.crypto import mtproto
+from pyrogram.session import Session
+from Backend.config import Telegram
+
+media_crypto_executor = (
+    ThreadPoolExecutor(Telegram.MEDIA_CRYPTO_WORKERS, thread_name_prefix="MediaCrypto")
+    if Telegram.MEDIA_CRYPTO_WORKERS else None
+)
+
+
+class OffloadLoop:
+    """
+    Event loop proxy for media sessions.
+    Pyrogram unpacks every incoming packet on its single shared CryptoWorker thread, so 1 MiB
+    upload.File responses from all streams queue behind each other and behind the bot's own
+    traffic. Routing mtproto.unpack (AES-IGE decrypt, SHA-256 check and TL deserialisation)
+    to a dedicated pool lets tgcrypto decrypt several chunks in parallel with the GIL released.
+    """
+
+    def __init__(self, loop):
+        self._loop = loop
+
+    def run_in_executor(self, executor, func, *args):
+        if func is mtproto.unpack:
+            executor = media_crypto_executor
+        return self._loop.run_in_executor(executor, func, *args)
+
+    def __getattr__(self, name):
+        return getattr(self._loop, name)
+
+
+class MediaSession(Session):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Opt-in: on a single core the pool only adds contention (benchmarks/loop_lag.py).
+        if media_crypto_executor:
+            self.loop = OffloadLoop(self.loop)
@@ -0,0 +1,206 @@
+import json
+import math
+from asyncio import Lock, create_task
+from os import path as ospath
+from time import time
+from typing import Dict, List, Optional
+from aiofiles import open as aiopen
+from aiofiles.os import makedirs, path as aiopath, remove as aioremove, rename as aiorename
+from pyrogram.file_id import FileId
+from starlette.responses import FileResponse
+from Backend.config import Telegram
+from Backend.logger import LOGGER
+from Backend.helper.affinity import select_client
+from Backend.helper.chunk_cache import CHUNK_SIZE
+from Backend.helper.custom_dl import get_byte_streamer
+from Backend.pyrofork.bot import multi_clients
+
+MAX_TRACKED_FILES = 10000
+
+
+class MirrorFileResponse(FileResponse):
+    # Mirrored files are large; fewer, bigger reads keep the threadpool and send() overhead down.
+    chunk_size = CHUNK_SIZE
+
+
+class MirrorTier:
+    def __init__(self, directory: str, max_bytes: int, min_plays: int):
+        self.directory = directory
+        self.index_path = ospath.join(directory, "index.json")
+        self.max_bytes = max_bytes
+        self.min_plays = min_plays
+        self.files: Dict[str, dict] = {}
+        self.plays: Dict[str, dict] = {}
+        self.downloading: Optional[str] = None
+        self.lock = Lock()
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(entry["file_size"] for entry in self.files.values())
+
+    def file_path(self, unique_id: str) -> str:
+        return ospath.join(self.directory, unique_id)
+
+    async def load(self):
+        try:
+            await makedirs(self.directory, exist_ok=True)
+            if await aiopath.exists(self.index_path):
+                async with aiopen(self.index_path, "r") as f:
+                    files = json.loads(await f.read())
+                for unique_id, entry in files.items():
+                    if await aiopath.exists(self.file_path(unique_id)):
+                        self.files[unique_id] = entry
+            LOGGER.info(f"Mirror tier: {len(self.files)} files, {self.used_bytes / 1024 ** 3:.2f} GiB")
+        except Exception as e:
+            LOGGER.error(f"Error loading mirror index: {e}")
+
+    async def save(self):
+        try:
+            async with aiopen(self.index_path, "w") as f:
+                await f.write(json.dumps(self.files))
+        except Exception as e:
+            LOGGER.error(f"Error saving mirror index: {e}")
+
+    def lookup(self, unique_id: str) -> Optional[str]:
+        entry = self.files.get(unique_id)
+        if not entry:
+            return None
+        entry["last_access"] = time()
+        return self.file_path(unique_id)
+
+    def record_play(self, file_id: FileId):
+        unique_id = file_id.unique_id
+        if unique_id in self.files:
+            self.files[unique_id]["plays"] += 1
+            return
+
+        stats = self.plays.setdefault(unique_id, {
+            "plays": 0,
+            "chat_id": file_id.message_chat_id,
+            "msg_id": file_id.message_id,
+            "file_size": file_id.file_size,
+            "file_name": getattr(file_id, "file_name", None),
+        })
+        stats["plays"] += 1
+        if len(self.plays) > MAX_TRACKED_FILES:
+            coldest = min(self.plays, key=lambda k: self.plays[k]["plays"])
+            del self.plays[coldest]
+
+        if stats["plays"] >= self.min_plays and not self.lock.locked():
+            create_task(self.mirror(unique_id))
+
+    async def make_room(self, size: int, plays: int) -> bool:
+        if size > self.max_bytes:
+            return False
+        candidates = sorted(
+            (k for k, entry in self.files.items() if not entry.get("pinned")),
+            key=lambda k: (self.files[k]["plays"], self.files[k]["last_access"])
+        )
+        evict, freed, needed = [], 0, self.used_bytes + size - self.max_bytes
+        for unique_id in candidates:
+            if freed >= needed:
+                break
+            if self.files[unique_id]["plays"] >= plays:
+                return False
+            evict.append(unique_id)
+            freed += self.files[unique_id]["file_size"]
+        if freed < needed:
+            return False
+        for unique_id in evict:
+            await self.evict(unique_id)
+        return True
+
+    async def mirror(self, unique_id: str, pinned: bool = False):
+        async with self.lock:
+            stats = self.plays.get(unique_id)
+            if unique_id in self.files or not stats or not multi_clients:
+                return
+            plays = math.inf if pinned else stats["plays"]
+            if not await self.make_room(stats["file_size"], plays):
+                LOGGER.debug(f"Mirror tier full, skipping {unique_id}")
+                return
+
+            self.downloading = unique_id
+            part_path = self.file_path(unique_id) + ".part"
+            try:
+                index = select_client(f"{stats['chat_id']}:{stats['msg_id']}")
+                tg_connect = get_byte_streamer(multi_clients[index])
+                file_id = await tg_connect.get_file_properties(stats["chat_id"], stats["msg_id"])
+                file_size = file_id.file_size
+                part_count = math.ceil(file_size / CHUNK_SIZE)
+                last_part_cut = ((file_size - 1) % CHUNK_SIZE) + 1
+
+                LOGGER.info(f"Mirroring {stats['file_name'] or unique_id} ({file_size / 1024 ** 2:.0f} MiB)")
+                written = 0
+                async with aiopen(part_path, "wb") as f:
+                    async for chunk in tg_connect.yield_file(
+                        file_id, index, 0, 0, last_part_cut, part_count, CHUNK_SIZE
+                    ):
+                        await f.write(chunk)
+                        written += len(chunk)
+
+                if written != file_size:
+                    raise IOError(f"incomplete download ({written}/{file_size} bytes)")
+                await aiorename(part_path, self.file_path(unique_id))
+                self.files[unique_id] = {
+                    "file_size": file_size,
+                    "file_name": stats["file_name"],
+                    "chat_id": stats["chat_id"],
+                    "msg_id": stats["msg_id"],
+                    "plays": stats["plays"],
+                    "pinned": pinned,
+                    "last_access": time(),
+                    "mirrored_at": time(),
+                }
+                self.plays.pop(unique_id, None)
+                await self.save()
+            except Exception as e:
+                LOGGER.error(f"Error mirroring {unique_id}: {e}")
+                if await aiopath.exists(part_path):
+                    await aioremove(part_path)
+            finally:
+                self.downloading = None
+
+    async def evict(self, unique_id: str) -> bool:
+        entry = self.files.pop(unique_id, None)
+        if not entry:
+            return False
+        try:
+            await aioremove(self.file_path(unique_id))
+        except FileNotFoundError:
+            pass
+        self.plays[unique_id] = {k: entry[k] for k in ("plays", "chat_id", "msg_id", "file_size", "file_name")}
+        await self.save()
+        LOGGER.info(f"Evicted {entry.get('file_name') or unique_id} from mirror tier")
+        return True
+
+    async def pin(self, unique_id: str, pinned: bool = True) -> bool:
+        if unique_id in self.files:
+            self.files[unique_id]["pinned"] = pinned
+            await self.save()
+            return True
+        if pinned and unique_id in self.plays:
+            create_task(self.mirror(unique_id, pinned=True))
+            return True
+        return False
+
+    def list(self) -> List[dict]:
+        return sorted(
+            ({"unique_id": k, **entry} for k, entry in self.files.items()),
+            key=lambda entry: entry["plays"], reverse=True
+        )
+
+    def stats(self) -> dict:
+        return {
+            "files": len(self.files),
+            "size": self.used_bytes,
+            "max_size": self.max_bytes,
+            "downloading": self.downloading,
+            "candidates": sorted(
+                ({"unique_id": k, "plays": v["plays"], "file_name": v["file_name"]} for k, v in self.plays.items()),
+                key=lambda entry: entry["plays"], reverse=True
+            )[:20],
+        }
+
+
+mirror_tier = MirrorTier(Telegram.MIRROR_DIR, int(Telegram.MIRROR_MAX_GB * 1024 ** 3), Telegram.MIRROR_MIN_PLAYS)
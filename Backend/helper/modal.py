@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 
 class QualityDetail(BaseModel):
@@ -7,6 +7,12 @@ class QualityDetail(BaseModel):
     id: str 
     name: str 
     size: str 
+    file_name: Optional[str] = None
+    file_size: Optional[int] = None
+    mime_type: Optional[str] = None
+    dc_id: Optional[int] = None
+    file_unique_id: Optional[str] = None
+    file_ids: Optional[Dict[str, str]] = None
 
 class Episode(BaseModel):
     episode_number: int
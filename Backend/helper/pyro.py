@@ -38,7 +38,37 @@ async def get_file_ids(client: Client, chat_id: int, message_id: int) -> Optiona
     except Exception as e:
         LOGGER.error(f"Error getting file IDs: {e}")
         raise
-        
+
+
+def get_media_properties(client: Client, media) -> dict:
+    """File properties persisted with each quality so streaming can skip get_messages."""
+    return {
+        "file_name": getattr(media, 'file_name', None),
+        "file_size": getattr(media, 'file_size', 0),
+        "mime_type": getattr(media, 'mime_type', ''),
+        "dc_id": FileId.decode(media.file_id).dc_id,
+        "file_unique_id": media.file_unique_id,
+        "file_ids": {str(client.me.id): media.file_id},
+    }
+
+
+def file_id_from_details(details: dict, bot_id: int) -> Optional[FileId]:
+    serialized = (details.get("file_ids") or {}).get(str(bot_id))
+    # Without the Telegram file name (stored before it was persisted) the response would carry the display name.
+    if not serialized or not details.get("file_unique_id") or "file_name" not in details:
+        return None
+    try:
+        file_id_obj = FileId.decode(serialized)
+    except Exception as e:
+        LOGGER.error(f"Error decoding stored file_id: {e}")
+        return None
+
+    setattr(file_id_obj, 'file_name', details['file_name'])
+    setattr(file_id_obj, 'file_size', details.get('file_size') or 0)
+    setattr(file_id_obj, 'mime_type', details.get('mime_type', ''))
+    setattr(file_id_obj, 'unique_id', details['file_unique_id'])
+    return file_id_obj
+
 
 
 def get_readable_file_size(size_in_bytes):
@@ -0,0 +1,296 @@
+import heapq
+import math
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+TITLE_WEIGHT = 1.0
+FILENAME_WEIGHT = 0.4
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.8
+FUZZY_SCORE = 0.6
+EXACT_TITLE_BONUS = 2.0
+MAX_PREFIX_TERMS = 64
+MIN_FUZZY_LENGTH = 4
+# Query tokens matching more titles than this (1080p, mkv, x264...) only refine matches of rarer
+# tokens; a query made of nothing else ranks title matches first, then the rest by rating.
+COMMON_TERM_DOCS = 5000
+MEDIA_TYPES = ("movie", "tv")
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(normalize(text))
+
+
+def deletes(term: str) -> Set[str]:
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+class SearchDoc:
+    __slots__ = ("media_type", "tmdb_id", "db_index", "title", "normalized_title", "rating", "terms")
+
+    def __init__(self, media_type: str, tmdb_id: int, db_index: int, title: str, rating: float):
+        self.media_type = media_type
+        self.tmdb_id = tmdb_id
+        self.db_index = db_index
+        self.title = title
+        self.normalized_title = " ".join(tokenize(title))
+        self.rating = rating
+        self.terms: Dict[str, float] = {}
+
+
+class SearchIndex:
+    """
+    In-process inverted index over titles and file names of both collections.
+    Query terms match exactly, as a prefix of an indexed term, or within one edit of a
+    title term (symmetric-delete lookup). Documents must match as many query terms as the
+    best document does and are ranked by match quality x field weight x idf, then rating.
+    Postings of very common tokens are never walked; see COMMON_TERM_DOCS.
+    """
+
+    def __init__(self):
+        self.docs: Dict[str, Dict[int, SearchDoc]] = {media_type: {} for media_type in MEDIA_TYPES}
+        # term -> media type -> tmdb_id -> field weight
+        self.postings: Dict[str, Dict[str, Dict[int, float]]] = {}
+        # term -> media type -> tmdb_ids having it in their title
+        self.title_postings: Dict[str, Dict[str, Set[int]]] = {}
+        self.vocabulary: List[str] = []
+        self.fuzzy: Dict[str, Set[str]] = {}
+        self.titles: Dict[str, Set[Tuple[str, int]]] = {}
+        self.ready = False
+
+    def __len__(self) -> int:
+        return sum(len(docs) for docs in self.docs.values())
+
+    def _add_term(self, doc: SearchDoc, term: str, weight: float, bulk: bool):
+        if doc.terms.get(term, 0) >= weight:
+            return
+        doc.terms[term] = weight
+        posting = self.postings.get(term)
+        if posting is None:
+            posting = self.postings[term] = {media_type: {} for media_type in MEDIA_TYPES}
+            if not bulk:
+                insort(self.vocabulary, term)
+        posting[doc.media_type][doc.tmdb_id] = weight
+        if weight == TITLE_WEIGHT:
+            title_posting = self.title_postings.get(term)
+            if title_posting is None:
+                title_posting = self.title_postings[term] = {media_type: set() for media_type in MEDIA_TYPES}
+            title_posting[doc.media_type].add(doc.tmdb_id)
+            if len(term) >= MIN_FUZZY_LENGTH:
+                for variant in deletes(term) | {term}:
+                    self.fuzzy.setdefault(variant, set()).add(term)
+
+    def add(self, media_type: str, doc: dict, db_index: int, file_names: Iterable[str] = (), bulk: bool = False):
+        tmdb_id = doc["tmdb_id"]
+        entry = self.docs[media_type].get(tmdb_id)
+        if entry is None or entry.title != (doc.get("title") or ""):
+            if entry is not None:
+                self.remove(media_type, tmdb_id)
+            entry = SearchDoc(media_type, tmdb_id, db_index, doc.get("title") or "", doc.get("rating") or 0)
+            self.docs[media_type][tmdb_id] = entry
+            self.titles.setdefault(entry.normalized_title, set()).add((media_type, tmdb_id))
+        entry.db_index = db_index
+        if doc.get("rating") is not None:
+            entry.rating = doc["rating"]
+
+        for term in tokenize(entry.title):
+            self._add_term(entry, term, TITLE_WEIGHT, bulk)
+        for name in file_names:
+            for term in tokenize(name):
+                self._add_term(entry, term, FILENAME_WEIGHT, bulk)
+
+    def move(self, media_type: str, tmdb_id: int, db_index: int):
+        entry = self.docs[media_type].get(tmdb_id)
+        if entry:
+            entry.db_index = db_index
+
+    def remove(self, media_type: str, tmdb_id: int):
+        entry = self.docs[media_type].pop(tmdb_id, None)
+        if not entry:
+            return
+        same_title = self.titles.get(entry.normalized_title)
+        if same_title:
+            same_title.discard((media_type, tmdb_id))
+            if not same_title:
+                del self.titles[entry.normalized_title]
+        for term, weight in entry.terms.items():
+            if weight == TITLE_WEIGHT:
+                title_posting = self.title_postings.get(term)
+                if title_posting is not None:
+                    title_posting[media_type].discard(tmdb_id)
+                    if not any(title_posting.values()):
+                        del self.title_postings[term]
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            posting[media_type].pop(tmdb_id, None)
+            if not any(posting.values()):
+                del self.postings[term]
+                index = bisect_left(self.vocabulary, term)
+                if index < len(self.vocabulary) and self.vocabulary[index] == term:
+                    del self.vocabulary[index]
+                # Fuzzy entries for vanished terms are left behind; matches are re-checked against postings.
+
+    def finish_bulk(self):
+        self.vocabulary = sorted(self.postings)
+        self.ready = True
+
+    def clear(self):
+        for docs in self.docs.values():
+            docs.clear()
+        self.postings.clear()
+        self.title_postings.clear()
+        self.vocabulary = []
+        self.fuzzy.clear()
+        self.titles.clear()
+        self.ready = False
+
+    def _candidates(self, token: str) -> Dict[str, float]:
+        terms = {}
+        if token in self.postings:
+            terms[token] = EXACT_SCORE
+
+        start = bisect_left(self.vocabulary, token)
+        for term in self.vocabulary[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(token):
+                break
+            terms.setdefault(term, PREFIX_SCORE * (0.5 + 0.5 * len(token) / len(term)))
+
+        if len(token) >= MIN_FUZZY_LENGTH:
+            for variant in deletes(token) | {token}:
+                for term in self.fuzzy.get(variant, ()):
+                    if term in self.postings:
+                        terms.setdefault(term, FUZZY_SCORE)
+        return terms
+
+    def _factors(self, terms: Dict[str, float], total: int) -> Dict[str, float]:
+        factors = {}
+        for term, quality in terms.items():
+            df = sum(len(ids) for ids in self.postings[term].values())
+            factors[term] = quality * math.log(1 + total / df)
+        return factors
+
+    def _lookup(self, factors: Dict[str, float], media_type: str, tmdb_id: int) -> float:
+        best = 0.0
+        for term, factor in factors.items():
+            weight = self.postings[term][media_type].get(tmdb_id)
+            if weight and factor * weight > best:
+                best = factor * weight
+        return best
+
+    def _score(self, candidates: List[Dict[str, float]], media_type: str, total: int, limit: Optional[int]
+               ) -> Tuple[int, int, Dict[int, float]]:
+        """Returns (tokens matched per hit, number of hits, scores of the hits worth ranking)."""
+        factors = [self._factors(terms, total) for terms in candidates]
+        frequency = [sum(len(self.postings[term][media_type]) for term in terms) for terms in candidates]
+        rare = [i for i, df in enumerate(frequency) if df <= COMMON_TERM_DOCS]
+        common = [i for i, df in enumerate(frequency) if df > COMMON_TERM_DOCS]
+        if not rare:
+            return self._score_common(factors, media_type, limit)
+
+        scores: Dict[int, float] = {}
+        matched: Dict[int, int] = {}
+        for i in rare:
+            best: Dict[int, float] = {}
+            for term, factor in factors[i].items():
+                for tmdb_id, weight in self.postings[term][media_type].items():
+                    score = factor * weight
+                    if score > best.get(tmdb_id, 0):
+                        best[tmdb_id] = score
+            for tmdb_id, score in best.items():
+                scores[tmdb_id] = scores.get(tmdb_id, 0) + score
+                matched[tmdb_id] = matched.get(tmdb_id, 0) + 1
+        # Common tokens only add to documents the rarer tokens already found.
+        for tmdb_id in scores:
+            for i in common:
+                score = self._lookup(factors[i], media_type, tmdb_id)
+                if score:
+                    scores[tmdb_id] += score
+                    matched[tmdb_id] += 1
+        required = max(matched.values(), default=0)
+        scores = {tmdb_id: score for tmdb_id, score in scores.items() if matched[tmdb_id] == required}
+        return required, len(scores), scores
+
+    def _score_common(self, factors: List[Dict[str, float]], media_type: str, limit: Optional[int]
+                      ) -> Tuple[int, int, Dict[int, float]]:
+        # Set algebra over posting keys runs in C; only title matches and the best-rated
+        # `limit` of the remaining hits are scored in Python.
+        hits = None
+        for token_factors in factors:
+            token_hits = set().union(*(self.postings[term][media_type].keys() for term in token_factors))
+            hits = token_hits if hits is None else hits & token_hits
+        required = len(factors)
+        if not hits:
+            required = 1
+            hits = set().union(*(self.postings[term][media_type].keys() for term in factors[0]))
+
+        titled = set()
+        for token_factors in factors:
+            for term in token_factors:
+                title_posting = self.title_postings.get(term)
+                if title_posting:
+                    titled |= title_posting[media_type] & hits
+        ranked = titled
+        if limit is None:
+            ranked = hits
+        elif len(titled) < limit:
+            docs = self.docs[media_type]
+            ranked = titled | set(heapq.nlargest(limit, hits - titled, key=lambda tmdb_id: docs[tmdb_id].rating))
+
+        scores = {}
+        for tmdb_id in ranked:
+            scores[tmdb_id] = sum(self._lookup(token_factors, media_type, tmdb_id) for token_factors in factors)
+        return required, len(hits), scores
+
+    def search(self, query: str, media_type: Optional[str] = None, limit: Optional[int] = None
+               ) -> Tuple[int, List[SearchDoc]]:
+        """Returns the number of matching titles and the best `limit` of them (all when limit is None)."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return 0, []
+
+        total = max(len(self), 1)
+        candidates = [self._candidates(token) for token in tokens]
+        if not all(candidates) and len(candidates) > 1:
+            # Tokens matching nothing cannot raise anyone's match count.
+            candidates = [terms for terms in candidates if terms]
+        if not all(candidates):
+            return 0, []
+        per_type = {
+            mt: self._score(candidates, mt, total, limit)
+            for mt in ((media_type,) if media_type else MEDIA_TYPES)
+        }
+        required = max(matched for matched, _, _ in per_type.values())
+        exact_titles = self.titles.get(" ".join(tokens), ())
+
+        count = 0
+        ranked: List[Tuple[float, float, SearchDoc]] = []
+        for mt, (matched, hits, scores) in per_type.items():
+            if not scores or matched != required:
+                continue
+            for exact_type, tmdb_id in exact_titles:
+                if exact_type == mt and tmdb_id in scores:
+                    scores[tmdb_id] *= EXACT_TITLE_BONUS
+            docs = self.docs[mt]
+            count += hits
+            items = scores.items()
+            if limit is not None:
+                items = heapq.nlargest(limit, items, key=lambda item: (item[1], docs[item[0]].rating))
+            ranked.extend((score, docs[tmdb_id].rating, docs[tmdb_id]) for tmdb_id, score in items)
+
+        ranked.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        if limit is not None:
+            ranked = ranked[:limit]
+        return count, [doc for _, _, doc in ranked]
+
+
+search_index = SearchIndex()
@@ -0,0 +1,113 @@
+import json
+from time import time
+from typing import Dict, List
+from aiofiles import open as aiopen
+from aiofiles.os import path as aiopath
+from pyrogram.file_id import FileId
+from Backend.config import Telegram
+from Backend.logger import LOGGER
+from Backend.helper.chunk_cache import CHUNK_SIZE, chunk_cache
+from Backend.helper.custom_dl import class_cache, get_byte_streamer
+from Backend.pyrofork.bot import multi_clients
+
+SNAPSHOT_MAX_AGE = 6 * 60 * 60
+MAX_FILES_PER_CLIENT = 500
+MAX_CHUNKS = 256
+FILE_ATTRS = ("message_chat_id", "message_id", "quality_id", "file_name", "file_size", "mime_type", "unique_id")
+
+
+def build_snapshot() -> dict:
+    clients = {}
+    for client, tg_connect in class_cache.items():
+        if not getattr(client, "me", None):
+            continue
+        file_ids = tg_connect.cached_file_ids()[-MAX_FILES_PER_CLIENT:]
+        clients[str(client.me.id)] = {
+            "dcs": sorted(tg_connect.session_pools),
+            "files": [
+                {"file_id": file_id.encode(), **{attr: getattr(file_id, attr, None) for attr in FILE_ATTRS}}
+                for file_id in file_ids
+            ],
+        }
+    return {
+        "saved_at": time(),
+        "clients": clients,
+        "chunks": chunk_cache.recent_keys(MAX_CHUNKS),
+    }
+
+
+async def save_snapshot():
+    try:
+        snapshot = build_snapshot()
+        async with aiopen(Telegram.WARM_RESTART_FILE, "w") as f:
+            await f.write(json.dumps(snapshot))
+        files = sum(len(entry["files"]) for entry in snapshot["clients"].values())
+        LOGGER.info(f"Saved warm-restart snapshot: {files} files, {len(snapshot['chunks'])} chunks")
+    except Exception as e:
+        LOGGER.error(f"Error saving warm-restart snapshot: {e}")
+
+
+def restore_file_id(entry: dict) -> FileId:
+    file_id = FileId.decode(entry["file_id"])
+    for attr in FILE_ATTRS:
+        setattr(file_id, attr, entry.get(attr))
+    return file_id
+
+
+async def restore_snapshot():
+    try:
+        if not await aiopath.exists(Telegram.WARM_RESTART_FILE):
+            return
+        async with aiopen(Telegram.WARM_RESTART_FILE, "r") as f:
+            snapshot = json.loads(await f.read())
+        if time() - snapshot.get("saved_at", 0) > SNAPSHOT_MAX_AGE:
+            LOGGER.info("Warm-restart snapshot is too old, skipping")
+            return
+    except Exception as e:
+        LOGGER.error(f"Error reading warm-restart snapshot: {e}")
+        return
+
+    clients_by_id = {str(client.me.id): client for client in multi_clients.values() if getattr(client, "me", None)}
+    owners: Dict[str, tuple] = {}
+    sessions: List[tuple] = []
+
+    # FileIds first: they cost nothing and stop viewers from hitting get_messages straight away.
+    for bot_id, entry in snapshot.get("clients", {}).items():
+        client = clients_by_id.get(bot_id)
+        if not client:
+            continue
+        tg_connect = get_byte_streamer(client)
+        by_dc = {}
+        for file_entry in entry.get("files", []):
+            try:
+                file_id = restore_file_id(file_entry)
+            except Exception:
+                continue
+            tg_connect.seed_file_id(file_id)
+            owners.setdefault(file_id.unique_id, (tg_connect, file_id))
+            by_dc.setdefault(file_id.dc_id, file_id)
+        sessions.extend((tg_connect, by_dc[dc_id]) for dc_id in entry.get("dcs", []) if dc_id in by_dc)
+
+    # Then media sessions, one at a time so auth exports don't burst.
+    for tg_connect, file_id in sessions:
+        try:
+            await tg_connect.generate_media_session(tg_connect.client, file_id)
+        except Exception as e:
+            LOGGER.debug(f"Warm restart: media session for DC {file_id.dc_id} failed: {e}")
+
+    # Finally the chunks that were hot in memory.
+    offsets: Dict[str, List[int]] = {}
+    for unique_id, offset in snapshot.get("chunks", []):
+        if unique_id in owners:
+            offsets.setdefault(unique_id, []).append(offset)
+    for unique_id, file_offsets in offsets.items():
+        tg_connect, file_id = owners[unique_id]
+        try:
+            await tg_connect.prefetch(file_id, file_offsets, CHUNK_SIZE)
+        except Exception as e:
+            LOGGER.debug(f"Warm restart: prefetch of {unique_id} failed: {e}")
+
+    LOGGER.info(
+        f"Warm restart: restored {len(owners)} files, {len(sessions)} media sessions, "
+        f"{sum(len(v) for v in offsets.values())} chunks"
+    )
@@ -0,0 +1,136 @@
+from asyncio import sleep
+from time import monotonic
+from typing import AsyncGenerator, Dict, List, Optional
+from fastapi import HTTPException
+from Backend.config import Telegram
+from Backend.logger import LOGGER
+
+MIB = 1024 * 1024
+# A lease whose response body never started (client vanished before the first chunk) is dropped after this.
+LEASE_START_TIMEOUT = 30
+BUCKET_BURST_SECONDS = 2
+
+
+class Tier:
+    def __init__(self, name: str, max_streams: int, rate_mb: float):
+        self.name = name
+        self.max_streams = max_streams
+        self.rate = rate_mb * MIB
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "max_streams": self.max_streams, "bytes_per_second": self.rate}
+
+
+class TokenBucket:
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = rate * BUCKET_BURST_SECONDS
+        self.tokens = self.capacity
+        self.updated = monotonic()
+
+    def consume(self, nbytes: int) -> float:
+        """Takes nbytes and returns how long the caller must wait; shared by every stream of the key."""
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= nbytes
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class StreamLease:
+    def __init__(self, key: str, tier: Tier):
+        self.key = key
+        self.tier = tier
+        self.created = monotonic()
+        self.started = False
+
+
+def parse_tiers(entries: List[str]) -> Dict[str, Tier]:
+    tiers = {}
+    for entry in entries:
+        try:
+            token, max_streams, rate_mb = entry.split(":")
+            tiers[token] = Tier(f"token:{token[:4]}…", int(max_streams), float(rate_mb))
+        except ValueError:
+            LOGGER.error(f"Invalid STREAM_TIERS entry (expected token:max_streams:mib_per_second): {entry}")
+    return tiers
+
+
+class StreamLimiter:
+    def __init__(self, default_tier: Tier, tiers: Dict[str, Tier]):
+        self.default_tier = default_tier
+        self.tiers = tiers
+        self.leases: Dict[str, List[StreamLease]] = {}
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.rejected = 0
+        self.throttled_seconds = 0.0
+
+    def resolve(self, token: Optional[str], client_ip: str):
+        if token and token in self.tiers:
+            return f"token:{token}", self.tiers[token]
+        return f"ip:{client_ip}", self.default_tier
+
+    def acquire(self, token: Optional[str], client_ip: str) -> StreamLease:
+        key, tier = self.resolve(token, client_ip)
+        now = monotonic()
+        leases = [
+            lease for lease in self.leases.get(key, [])
+            if lease.started or now - lease.created < LEASE_START_TIMEOUT
+        ]
+        if tier.max_streams and len(leases) >= tier.max_streams:
+            self.rejected += 1
+            self.leases[key] = leases
+            raise HTTPException(
+                status_code=429,
+                detail=f"Too many concurrent streams (limit {tier.max_streams})",
+                headers={"Retry-After": "5"},
+            )
+        lease = StreamLease(key, tier)
+        leases.append(lease)
+        self.leases[key] = leases
+        return lease
+
+    def release(self, lease: Optional[StreamLease]):
+        if lease is None:
+            return
+        leases = self.leases.get(lease.key)
+        if leases and lease in leases:
+            leases.remove(lease)
+        if not leases:
+            self.leases.pop(lease.key, None)
+            self.buckets.pop(lease.key, None)
+
+    async def limit(self, body: AsyncGenerator, lease: StreamLease):
+        lease.started = True
+        bucket = None
+        if lease.tier.rate:
+            bucket = self.buckets.setdefault(lease.key, TokenBucket(lease.tier.rate))
+        try:
+            async for chunk in body:
+                if bucket:
+                    wait = bucket.consume(len(chunk))
+                    if wait:
+                        self.throttled_seconds += wait
+                        await sleep(wait)
+                yield chunk
+        finally:
+            self.release(lease)
+            await body.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "default_tier": self.default_tier.to_dict(),
+            "tiers": [tier.to_dict() for tier in self.tiers.values()],
+            "active": {
+                (self.tiers[key[6:]].name if key.startswith("token:") else key): len(leases)
+                for key, leases in self.leases.items()
+            },
+            "rejected": self.rejected,
+            "throttled_seconds": round(self.throttled_seconds, 1),
+        }
+
+
+stream_limiter = StreamLimiter(
+    Tier("ip", Telegram.STREAM_MAX_PER_IP, Telegram.STREAM_RATE_PER_IP_MB),
+    parse_tiers(Telegram.STREAM_TIERS),
+)
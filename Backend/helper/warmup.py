@@ -0,0 +1,53 @@
+from asyncio import create_task
+from time import time
+from typing import Dict, List, Optional
+from Backend.config import Telegram
+from Backend.logger import LOGGER
+from Backend.helper.affinity import select_client
+from Backend.helper.chunk_cache import CHUNK_SIZE
+from Backend.helper.custom_dl import get_byte_streamer
+from Backend.helper.encrypt import decode_string
+from Backend.pyrofork.bot import multi_clients
+
+WARMUP_COOLDOWN = 10 * 60
+recently_warmed: Dict[str, float] = {}
+
+
+async def warm_quality(quality: dict, offsets: Optional[List[int]] = None):
+    try:
+        decoded = await decode_string(quality["id"])
+        chat_id = int(f"-100{decoded['chat_id']}")
+        msg_id = int(decoded["msg_id"])
+
+        # Same selection as media_streamer, so the warm FileId and session are the ones /dl will use.
+        index = select_client(f"{chat_id}:{msg_id}")
+        tg_connect = get_byte_streamer(multi_clients[index])
+        details = quality if quality.get("file_unique_id") else None
+        file_id = await tg_connect.get_file_properties(chat_id=chat_id, message_id=msg_id, details=details)
+        await tg_connect.generate_media_session(tg_connect.client, file_id)
+
+        if offsets is None:
+            offsets = [0]
+            if file_id.file_size > CHUNK_SIZE:
+                offsets.append((file_id.file_size - 1) - ((file_id.file_size - 1) % CHUNK_SIZE))
+        await tg_connect.prefetch(file_id, offsets, CHUNK_SIZE)
+        LOGGER.debug(f"Warmed message {msg_id} on client {index} ({len(offsets)} chunks)")
+    except Exception as e:
+        LOGGER.debug(f"Warm-up failed for {quality.get('id')}: {e}")
+
+
+def schedule_warmup(qualities: List[dict]):
+    if not Telegram.PREDICTIVE_WARMUP or not multi_clients:
+        return
+
+    now = time()
+    for quality in qualities[:Telegram.WARMUP_MAX_STREAMS]:
+        key = quality.get("id")
+        if not key or now - recently_warmed.get(key, 0) < WARMUP_COOLDOWN:
+            continue
+        recently_warmed[key] = now
+        create_task(warm_quality(quality))
+
+    if len(recently_warmed) > 4096:
+        for key in [k for k, warmed_at in recently_warmed.items() if now - warmed_at >= WARMUP_COOLDOWN]:
+            del recently_warmed[key]
@@ -1,5 +1,7 @@
 from asyncio import sleep as asleep
+from typing import Tuple
 from pyrogram import filters, Client
+from pyrogram.errors import FloodWait
 from pyrogram.types import Message
 from pyrogram.enums.parse_mode import ParseMode
 
@@ -7,6 +9,49 @@ from Backend.helper.custom_filter import CustomFilters
 from Backend.logger import LOGGER
 from Backend import db
 
+BATCH_SIZE = 200
+
+
+async def check_batch(client: Client, chat_id: int, entries: list) -> Tuple[list, int]:
+    """Returns the broken entries and how many entries could not be checked at all."""
+    broken = []
+    full_chat_id = int(f"-100{chat_id}")
+    while True:
+        try:
+            messages = await client.get_messages(full_chat_id, [entry["msg_id"] for entry in entries])
+            break
+        except FloodWait as e:
+            LOGGER.warning(f"Cleanup FloodWait: {e.value}s")
+            await asleep(e.value)
+        except Exception as e:
+            # A failed lookup says nothing about the messages themselves.
+            LOGGER.error(f"Error checking messages in {full_chat_id}: {e}")
+            return [], len(entries)
+    if not isinstance(messages, list):
+        messages = [messages]
+
+    for entry, msg in zip(entries, messages):
+        if msg and not msg.empty and (msg.video or msg.document):
+            continue
+        report = {
+            "type": entry["media_type"],
+            "title": entry.get("title"),
+            "quality": entry.get("quality"),
+            "chat_id": full_chat_id,
+            "msg_id": entry["msg_id"],
+            "tmdb_id": entry.get("tmdb_id"),
+            "db_index": entry.get("db_index"),
+        }
+        if entry["media_type"] == "tv":
+            report.update(season=entry.get("season_number"), episode=entry.get("episode_number"))
+            LOGGER.warning(f"Broken link found: {entry.get('title')} S{report['season']}E{report['episode']} - {entry.get('quality')}")
+        else:
+            LOGGER.warning(f"Broken link found: {entry.get('title')} - {entry.get('quality')}")
+        broken.append(report)
+
+    await asleep(1)  # Small delay to avoid rate limits
+    return broken, 0
+
 
 @Client.on_message(filters.command('cleanup') & filters.private & CustomFilters.owner, group=10)
 async def cleanup_broken_links(client: Client, message: Message):
@@ -23,129 +68,49 @@ async def cleanup_broken_links(client: Client, message: Message):
             parse_mode=ParseMode.MARKDOWN
         )
         
+        if not db.file_registry_ready:
+            await status_msg.edit_text("⏳ File registry is still being built, try again in a minute.")
+            return
+
         broken_entries = []
-        checked = 0
-        total_movies = 0
-        total_tv = 0
-        
-        # Check all storage databases
-        total_storage_dbs = len(db.dbs) - 1
-        for db_index in range(1, total_storage_dbs + 1):
-            db_key = f"storage_{db_index}"
-            
-            # Check movies
-            LOGGER.info(f"Checking movies in {db_key}...")
-            movies = await db.dbs[db_key]["movie"].find({}).to_list(None)
-            total_movies += len(movies)
-            
-            for movie in movies:
-                for quality in movie.get("telegram", []):
-                    checked += 1
-                    try:
-                        from Backend.helper.encrypt import decode_string
-                        decoded = await decode_string(quality["id"])
-                        chat_id = int(f"-100{decoded['chat_id']}")
-                        msg_id = int(decoded["msg_id"])
-                        
-                        # Try to fetch the message
-                        msg = await client.get_messages(chat_id, msg_id)
-                        
-                        if not msg or not (msg.video or msg.document):
-                            broken_entries.append({
-                                "type": "movie",
-                                "title": movie.get("title"),
-                                "quality": quality.get("quality"),
-                                "chat_id": chat_id,
-                                "msg_id": msg_id,
-                                "tmdb_id": movie.get("tmdb_id"),
-                                "db_index": movie.get("db_index")
-                            })
-                            LOGGER.warning(f"Broken link found: {movie.get('title')} - {quality.get('quality')}")
-                    except Exception as e:
-                        broken_entries.append({
-                            "type": "movie",
-                            "title": movie.get("title"),
-                            "quality": quality.get("quality"),
-                            "error": str(e),
-                            "tmdb_id": movie.get("tmdb_id"),
-                            "db_index": movie.get("db_index")
-                        })
-                        LOGGER.error(f"Error checking movie {movie.get('title')}: {e}")
-                    
-                    if checked % 10 == 0:
-                        await status_msg.edit_text(
-                            f"🔍 Scanning database...\n"
-                            f"📊 Checked: {checked} entries\n"
-                            f"❌ Broken: {len(broken_entries)}\n"
-                            f"📽️ Movies: {total_movies}\n"
-                            f"📺 TV Shows: {total_tv}",
-                            parse_mode=ParseMode.MARKDOWN
-                        )
-                    
-                    await asleep(0.1)  # Small delay to avoid rate limits
-            
-            # Check TV shows
-            LOGGER.info(f"Checking TV shows in {db_key}...")
-            tv_shows = await db.dbs[db_key]["tv"].find({}).to_list(None)
-            total_tv += len(tv_shows)
-            
-            for show in tv_shows:
-                for season in show.get("seasons", []):
-                    for episode in season.get("episodes", []):
-                        for quality in episode.get("telegram", []):
-                            checked += 1
-                            try:
-                                from Backend.helper.encrypt import decode_string
-                                decoded = await decode_string(quality["id"])
-                                chat_id = int(f"-100{decoded['chat_id']}")
-                                msg_id = int(decoded["msg_id"])
-                                
-                                # Try to fetch the message
-                                msg = await client.get_messages(chat_id, msg_id)
-                                
-                                if not msg or not (msg.video or msg.document):
-                                    broken_entries.append({
-                                        "type": "tv",
-                                        "title": show.get("title"),
-                                        "season": season.get("season_number"),
-                                        "episode": episode.get("episode_number"),
-                                        "quality": quality.get("quality"),
-                                        "chat_id": chat_id,
-                                        "msg_id": msg_id,
-                                        "tmdb_id": show.get("tmdb_id"),
-                                        "db_index": show.get("db_index")
-                                    })
-                                    LOGGER.warning(f"Broken link found: {show.get('title')} S{season.get('season_number')}E{episode.get('episode_number')} - {quality.get('quality')}")
-                            except Exception as e:
-                                broken_entries.append({
-                                    "type": "tv",
-                                    "title": show.get("title"),
-                                    "season": season.get("season_number"),
-                                    "episode": episode.get("episode_number"),
-                                    "quality": quality.get("quality"),
-                                    "error": str(e),
-                                    "tmdb_id": show.get("tmdb_id"),
-                                    "db_index": show.get("db_index")
-                                })
-                                LOGGER.error(f"Error checking TV show {show.get('title')}: {e}")
-                            
-                            if checked % 10 == 0:
-                                await status_msg.edit_text(
-                                    f"🔍 Scanning database...\n"
-                                    f"📊 Checked: {checked} entries\n"
-                                    f"❌ Broken: {len(broken_entries)}\n"
-                                    f"📽️ Movies: {total_movies}\n"
-                                    f"📺 TV Shows: {total_tv}",
-                                    parse_mode=ParseMode.MARKDOWN
-                                )
-                            
-                            await asleep(0.1)
+        checked = unchecked = 0
+        total_movies = await db.dbs["tracking"]["files"].count_documents({"media_type": "movie"})
+        total_tv = await db.dbs["tracking"]["files"].count_documents({"media_type": "tv"})
+
+        # The file registry lists every stored file with its message id, so messages
+        # can be checked in batches per channel instead of walking every document.
+        batch, batch_chat = [], None
+        cursor = db.dbs["tracking"]["files"].find({}).sort([("chat_id", 1), ("msg_id", 1)])
+        async for entry in cursor:
+            if batch and (entry["chat_id"] != batch_chat or len(batch) >= BATCH_SIZE):
+                broken, failed = await check_batch(client, batch_chat, batch)
+                broken_entries.extend(broken)
+                checked += len(batch) - failed
+                unchecked += failed
+                batch = []
+                await status_msg.edit_text(
+                    f"🔍 Scanning database...\n"
+                    f"📊 Checked: {checked} entries\n"
+                    f"❌ Broken: {len(broken_entries)}\n"
+                    f"❔ Unknown: {unchecked}\n"
+                    f"📽️ Movie files: {total_movies}\n"
+                    f"📺 Episode files: {total_tv}",
+                    parse_mode=ParseMode.MARKDOWN
+                )
+            batch_chat = entry["chat_id"]
+            batch.append(entry)
+        if batch:
+            broken, failed = await check_batch(client, batch_chat, batch)
+            broken_entries.extend(broken)
+            checked += len(batch) - failed
+            unchecked += failed
         
         # Final report
         if broken_entries:
             report = "⚠️ **Broken Links Found!**\n\n"
             report += f"Total Checked: {checked}\n"
-            report += f"Broken Links: {len(broken_entries)}\n\n"
+            report += f"Broken Links: {len(broken_entries)}\n"
+            report += f"Could not check: {unchecked}\n\n"
             report += "**First 10 broken entries:**\n"
             
             for i, entry in enumerate(broken_entries[:10]):
@@ -172,8 +137,9 @@ async def cleanup_broken_links(client: Client, message: Message):
                 f"✅ **Cleanup Complete!**\n\n"
                 f"📊 Total Checked: {checked} entries\n"
                 f"✨ No broken links found!\n"
-                f"📽️ Movies: {total_movies}\n"
-                f"📺 TV Shows: {total_tv}",
+                f"❔ Could not check: {unchecked}\n"
+                f"📽️ Movie files: {total_movies}\n"
+                f"📺 Episode files: {total_tv}",
                 parse_mode=ParseMode.MARKDOWN
             )
         
@@ -1,10 +1,10 @@
-from asyncio import create_task, sleep as asleep, Queue, Lock
+from asyncio import create_task, get_running_loop, sleep as asleep, wait_for, Queue, Lock, TimeoutError as AsyncTimeoutError
 import Backend
 from Backend.helper.task_manager import edit_message
 from Backend.logger import LOGGER
 from Backend import db
 from Backend.config import Telegram
-from Backend.helper.pyro import clean_filename, get_readable_file_size, remove_urls
+from Backend.helper.pyro import clean_filename, get_media_properties, get_readable_file_size, remove_urls
 from Backend.helper.metadata import metadata
 from pyrogram import filters, Client
 from pyrogram.types import Message
@@ -15,16 +15,44 @@ from pyrogram.enums.parse_mode import ParseMode
 file_queue = Queue()
 db_lock = Lock()
 
+async def next_batch() -> list:
+    # Block for the first file, then keep draining until the batch is full or the wait runs out.
+    batch = [await file_queue.get()]
+    loop = get_running_loop()
+    deadline = loop.time() + Telegram.INGEST_BATCH_WAIT_MS / 1000
+    while len(batch) < Telegram.INGEST_BATCH_SIZE:
+        if not file_queue.empty():
+            batch.append(file_queue.get_nowait())
+            continue
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(await wait_for(file_queue.get(), remaining))
+        except AsyncTimeoutError:
+            break
+    return batch
+
 async def process_file():
     while True:
-        metadata_info, channel, msg_id, size, title = await file_queue.get()
-        async with db_lock:
-            updated_id = await db.insert_media(metadata_info, channel=channel, msg_id=msg_id, size=size, name=title)
-            if updated_id:
-                LOGGER.info(f"{metadata_info['media_type']} updated with ID: {updated_id}")
-            else:
-                LOGGER.info("Update failed due to validation errors.")
-        file_queue.task_done()
+        batch = await next_batch()
+        try:
+            async with db_lock:
+                updated_ids = await db.insert_media_batch([
+                    {"metadata_info": metadata_info, "channel": channel, "msg_id": msg_id,
+                     "size": size, "name": title, "file_info": file_info}
+                    for metadata_info, channel, msg_id, size, title, file_info in batch
+                ])
+            for (metadata_info, *_), updated_id in zip(batch, updated_ids):
+                if updated_id:
+                    LOGGER.info(f"{metadata_info['media_type']} updated with ID: {updated_id}")
+                else:
+                    LOGGER.info("Update failed due to validation errors.")
+        except Exception as e:
+            LOGGER.error(f"Error processing batch of {len(batch)} files: {e}")
+        finally:
+            for _ in batch:
+                file_queue.task_done()
 
 for _ in range(1):
     create_task(process_file())
@@ -58,7 +86,8 @@ async def file_receive_handler(client: Client, message: Message):
                         new_caption=new_caption
                     ))
 
-                await file_queue.put((metadata_info, int(channel), msg_id, size, title))
+                file_info = get_media_properties(client, file)
+                await file_queue.put((metadata_info, int(channel), msg_id, size, title, file_info))
             else:
                 await message.reply_text("> Not supported")
         except FloodWait as e:
@@ -2,6 +2,8 @@ from pyrogram import filters, Client, enums
 from pyrogram.types import Message
 from Backend.helper.custom_filter import CustomFilters
 from Backend.logger import LOGGER
+from Backend.config import Telegram
+from Backend.helper.snapshot import save_snapshot
 from asyncio import create_subprocess_exec, gather
 from aiofiles import open as aiopen
 from os import execl as osexecl
@@ -22,6 +24,9 @@ async def restart(client: Client, message: Message):
         async with aiopen(".restartmsg", "w") as f:
             await f.write(f"{restart_message.chat.id}\n{restart_message.id}\n")
 
+        if Telegram.WARM_RESTART:
+            await save_snapshot()
+
         LOGGER.info("Restarting the bot using uv package manager...")
 
         uv_path = shutil.which("uv")
@@ -8,7 +8,7 @@ import Backend
 from Backend.helper.custom_filter import CustomFilters
 from Backend.logger import LOGGER
 from Backend.config import Telegram
-from Backend.helper.pyro import clean_filename, get_readable_file_size, remove_urls
+from Backend.helper.pyro import clean_filename, get_media_properties, get_readable_file_size, remove_urls
 from Backend.helper.metadata import metadata
 from Backend import db
 
@@ -210,7 +210,8 @@ async def scan_channel(client: Client, message: Message):
                             title += '.mkv'
                         
                         # Insert to database
-                        updated_id = await db.insert_media(metadata_info, channel=int(channel), msg_id=msg_id, size=size, name=title)
+                        file_info = get_media_properties(client, file)
+                        updated_id = await db.insert_media(metadata_info, channel=int(channel), msg_id=msg_id, size=size, name=title, file_info=file_info)
                         
                         if updated_id:
                             added += 1
@@ -272,36 +273,29 @@ async def scan_channel(client: Client, message: Message):
 
 async def check_existing_file(channel: int, msg_id: int) -> bool:
     """
-    Check if a file already exists in the database by checking all storage DBs.
+    Check if a file already exists in the database.
+    Uses the file registry once it is built, otherwise checks all storage DBs.
     Returns True if found, False otherwise.
     """
     try:
+        if db.file_registry_ready:
+            return await db.file_exists(channel, msg_id)
+
         from Backend.helper.encrypt import encode_string
         
         # Generate the encoded string for this file
         data = {"chat_id": channel, "msg_id": msg_id}
         encoded_id = await encode_string(data)
         
-        # Search in all storage databases
-        total_storage_dbs = len(db.dbs) - 1
-        for db_index in range(1, total_storage_dbs + 1):
-            db_key = f"storage_{db_index}"
-            
-            # Check movies collection
-            movie = await db.dbs[db_key]["movie"].find_one(
-                {"telegram.id": encoded_id}
-            )
-            if movie:
-                return True
-            
-            # Check TV shows collection
-            tv = await db.dbs[db_key]["tv"].find_one(
-                {"seasons.episodes.telegram.id": encoded_id}
+        # Search all storage databases concurrently
+        async def find_in_shard(_, storage_db):
+            return (
+                await storage_db["movie"].find_one({"telegram.id": encoded_id}, {"_id": 1})
+                or await storage_db["tv"].find_one({"seasons.episodes.telegram.id": encoded_id}, {"_id": 1})
             )
-            if tv:
-                return True
-        
-        return False
+
+        found = await db.fan_out(find_in_shard, partial=False)
+        return any(found.values())
         
     except Exception as e:
         LOGGER.error(f"Error checking existing file: {e}")
@@ -0,0 +1,105 @@
+"""
+Event-loop lag while unpacking 1 MiB upload.File responses.
+
+Compares three ways of running mtproto.unpack (AES-IGE decrypt + SHA-256 check + TL read)
+for N concurrent streams:
+  inline   - on the event loop itself
+  pyrogram - on pyrogram's single shared CryptoWorker thread (stock media sessions)
+  pool     - on a dedicated pool, as MediaSession does when MEDIA_CRYPTO_WORKERS > 0
+
+Usage: uv run benchmarks/loop_lag.py [--streams 16] [--chunks 32] [--workers 4]
+"""
+import argparse
+import asyncio
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1, sha256
+from io import BytesIO
+from os import urandom
+from time import perf_counter
+
+import pyrogram
+from pyrogram import raw
+from pyrogram.crypto import aes, mtproto
+from pyrogram.raw.core import Long, Message
+
+CHUNK_SIZE = 1024 * 1024
+TICK = 0.005
+
+
+def server_pack(body, session_id: bytes, auth_key: bytes, auth_key_id: bytes) -> bytes:
+    # Mirror of mtproto.pack for the server -> client direction so mtproto.unpack accepts it.
+    message = Message(body, msg_id=(1 << 62) | 1, seq_no=1, length=len(body.write()))
+    data = Long(0) + session_id + message.write()
+    padding = urandom(-(len(data) + 12) % 16 + 12)
+    msg_key = sha256(auth_key[96:96 + 32] + data + padding).digest()[8:24]
+    aes_key, aes_iv = mtproto.kdf(auth_key, msg_key, False)
+    return auth_key_id + msg_key + aes.ige256_encrypt(data + padding, aes_key, aes_iv)
+
+
+async def measure_lag(stop: asyncio.Event, samples: list):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + TICK
+        await asyncio.sleep(TICK)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def run(mode: str, packet: bytes, session_id: bytes, auth_key: bytes, auth_key_id: bytes,
+              streams: int, chunks: int, executor) -> dict:
+    loop = asyncio.get_running_loop()
+
+    async def unpack():
+        args = (BytesIO(packet), session_id, auth_key, auth_key_id)
+        if executor is None:
+            return mtproto.unpack(*args)
+        return await loop.run_in_executor(executor, mtproto.unpack, *args)
+
+    async def stream():
+        for _ in range(chunks):
+            await unpack()
+            await asyncio.sleep(0)
+
+    samples, stop = [], asyncio.Event()
+    ticker = asyncio.create_task(measure_lag(stop, samples))
+    started = perf_counter()
+    await asyncio.gather(*(stream() for _ in range(streams)))
+    elapsed = perf_counter() - started
+    stop.set()
+    await ticker
+
+    samples.sort()
+    return {
+        "mode": mode,
+        "MiB/s": streams * chunks / elapsed,
+        "lag_p50_ms": statistics.median(samples) * 1000 if samples else 0.0,
+        "lag_p99_ms": samples[int(len(samples) * 0.99) - 1] * 1000 if samples else 0.0,
+        "lag_max_ms": samples[-1] * 1000 if samples else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=16)
+    parser.add_argument("--chunks", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    auth_key = urandom(256)
+    auth_key_id = sha1(auth_key).digest()[-8:]
+    session_id = urandom(8)
+    body = raw.types.upload.File(type=raw.types.storage.FilePartial(), mtime=0, bytes=urandom(CHUNK_SIZE))
+    packet = server_pack(body, session_id, auth_key, auth_key_id)
+
+    pool = ThreadPoolExecutor(args.workers, thread_name_prefix="MediaCrypto")
+    print(f"{args.streams} streams x {args.chunks} chunks of 1 MiB, pool workers={args.workers}")
+    print(f"{'mode':<10}{'MiB/s':>10}{'lag p50 ms':>12}{'lag p99 ms':>12}{'lag max ms':>12}")
+    for mode, executor in (("inline", None), ("pyrogram", pyrogram.crypto_executor), ("pool", pool)):
+        result = await run(mode, packet, session_id, auth_key, auth_key_id, args.streams, args.chunks, executor)
+        print(f"{result['mode']:<10}{result['MiB/s']:>10.1f}{result['lag_p50_ms']:>12.2f}"
+              f"{result['lag_p99_ms']:>12.2f}{result['lag_max_ms']:>12.2f}")
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())